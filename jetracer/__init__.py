@@ -1,2 +1,25 @@
-from .racecar import Racecar
-from .camera_utils import JetRacerCamera
\ No newline at end of file
+import importlib
+
+
+# submodules are imported on first attribute access, so ``import jetracer``
+# (and any ``jetracer.x`` submodule import) doesn't pull in the camera and
+# servo stacks
+_LAZY = {
+    'Racecar': '.racecar',
+    'JetRacerCamera': '.camera_utils',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
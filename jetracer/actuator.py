@@ -0,0 +1,87 @@
+import collections
+import threading
+import time
+
+from .tracing import tracer
+
+
+class ActuatorWriter(object):
+    """Coalesces actuator commands and flushes them from a dedicated writer thread.
+
+    ``set(channel, value)`` only records the newest value for a channel and
+    returns immediately.  The writer thread calls ``flush({channel: value})``
+    with everything that changed since the last flush, at most ``max_rate``
+    times a second, so intermediate values are dropped rather than queued.
+    """
+
+    def __init__(self, flush, max_rate=100.0, history=1000):
+        self.flush = flush
+        self.max_rate = max_rate
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.command_count = 0
+        self.flush_count = 0
+        self.coalesced = 0
+        self.latencies = collections.deque(maxlen=history)
+        self._thread = threading.Thread(target=self._run, name='jetracer-actuator', daemon=True)
+        self._thread.start()
+
+    def set(self, channel, value):
+        with self._lock:
+            if channel in self._pending:
+                self.coalesced += 1
+            self._pending[channel] = (value, time.monotonic())
+            self.command_count += 1
+        self._wake.set()
+
+    def _take(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._wake.clear()
+        return pending
+
+    def _write(self, pending):
+        with tracer.span('actuator.flush'):
+            self.flush({channel: value for channel, (value, _) in pending.items()})
+        done = time.monotonic()
+        self.flush_count += 1
+        for _, commanded in pending.values():
+            self.latencies.append(done - commanded)
+
+    def _run(self):
+        period = 1.0 / self.max_rate if self.max_rate else 0.0
+        while True:
+            self._wake.wait()
+            pending = self._take()
+            if pending:
+                started = time.monotonic()
+                try:
+                    self._write(pending)
+                except Exception as e:
+                    print(f"actuator write failed: {e}")
+                remaining = period - (time.monotonic() - started)
+                if remaining > 0 and not self._closed:
+                    time.sleep(remaining)
+            if self._closed:
+                break
+
+    def close(self):
+        """Stop the writer thread after flushing whatever is still pending."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        pending = self._take()
+        if pending:
+            self._write(pending)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            'commands': self.command_count,
+            'flushes': self.flush_count,
+            'coalesced': self.coalesced,
+            'latency_p50': latencies[len(latencies) // 2] if latencies else None,
+            'latency_max': latencies[-1] if latencies else None,
+        }
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+
+def parse_xy(filename):
+    """Return the ``(x, y)`` label encoded in an ``<x>_<y>_<uuid>.jpg`` filename."""
+    items = filename.split('_')
+    return int(items[0]), int(items[1])
+
+
+class AnnotationIndex(object):
+    """On-disk index of the labelled images in an ``XYDataset`` directory.
+
+    Annotations live in a SQLite file inside the dataset directory and are
+    mirrored in memory as growable columnar arrays, so appending an entry and
+    counting a category are O(1) regardless of dataset size.  The index is
+    only compared against the files on disk when ``reconcile()`` is called.
+    """
+
+    FILENAME = 'annotations.sqlite'
+
+    def __init__(self, directory, categories, filename=FILENAME):
+        self.directory = directory
+        self.categories = list(categories)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, filename)
+        self.created = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS annotations ('
+            'id INTEGER PRIMARY KEY, category TEXT NOT NULL, filename TEXT NOT NULL, '
+            'x INTEGER NOT NULL, y INTEGER NOT NULL, UNIQUE (category, filename))')
+        self._db.commit()
+        self._load()
+
+    def _load(self):
+        self._size = 0
+        self._capacity = 0
+        self.category_index = np.zeros(0, dtype=np.int16)
+        self.x = np.zeros(0, dtype=np.int32)
+        self.y = np.zeros(0, dtype=np.int32)
+        self.filenames = []
+        self._counts = [0] * len(self.categories)
+        placeholders = ','.join('?' * len(self.categories))
+        rows = self._db.execute(
+            'SELECT category, filename, x, y FROM annotations WHERE category IN (%s) ORDER BY id' % placeholders,
+            self.categories).fetchall()
+        self._reserve(len(rows))
+        for category, filename, x, y in rows:
+            self._append(self.categories.index(category), filename, x, y)
+
+    def _reserve(self, capacity):
+        if capacity <= self._capacity:
+            return
+        capacity = max(capacity, 2 * self._capacity, 64)
+        for name in ('category_index', 'x', 'y'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+        self._capacity = capacity
+
+    def _append(self, category_index, filename, x, y):
+        self._reserve(self._size + 1)
+        self.category_index[self._size] = category_index
+        self.x[self._size] = x
+        self.y[self._size] = y
+        self.filenames.append(filename)
+        self._counts[category_index] += 1
+        self._size += 1
+
+    def __getstate__(self):
+        # DataLoader workers started with spawn only need the in-memory columns
+        state = self.__dict__.copy()
+        state['_db'] = None
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def image_path(self, i):
+        return os.path.join(self.directory, self.categories[self.category_index[i]], self.filenames[i])
+
+    def labels(self):
+        """Return views of the ``(category_index, x, y)`` columns."""
+        return self.category_index[:self._size], self.x[:self._size], self.y[:self._size]
+
+    def count(self, category):
+        return self._counts[self.categories.index(category)]
+
+    def add(self, category, filename, x, y):
+        with self._lock:
+            self._db.execute('INSERT INTO annotations (category, filename, x, y) VALUES (?, ?, ?, ?)',
+                             (category, filename, int(x), int(y)))
+            self._db.commit()
+            self._append(self.categories.index(category), filename, x, y)
+
+    def reconcile(self):
+        """Bring the index in line with the ``*.jpg`` files on disk; return ``(added, removed)``."""
+        with self._lock:
+            added = removed = 0
+            for category in self.categories:
+                category_dir = os.path.join(self.directory, category)
+                on_disk = set()
+                if os.path.isdir(category_dir):
+                    on_disk = {e.name for e in os.scandir(category_dir) if e.name.endswith('.jpg')}
+                indexed = {row[0] for row in self._db.execute(
+                    'SELECT filename FROM annotations WHERE category = ?', (category,))}
+                new = sorted(on_disk - indexed)
+                gone = indexed - on_disk
+                self._db.executemany(
+                    'INSERT INTO annotations (category, filename, x, y) VALUES (?, ?, ?, ?)',
+                    [(category, name) + parse_xy(name) for name in new])
+                self._db.executemany('DELETE FROM annotations WHERE category = ? AND filename = ?',
+                                     [(category, name) for name in gone])
+                added += len(new)
+                removed += len(gone)
+            self._db.commit()
+            self._load()
+        return added, removed
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,69 @@
+"""On-disk cache of converted model artifacts, keyed by content hash.
+
+Converting a checkpoint (TorchScript tracing, ONNX export, int8
+calibration, ``torch2trt``) takes from seconds to minutes but only depends
+on the checkpoint bytes and the conversion settings.  ``cached_artifact``
+names the output after a sha256 of both, so a second start with the same
+checkpoint just opens the file, and retraining or upgrading a library
+produces a new entry instead of a stale one::
+
+    path = cached_artifact('model.pth', 'onnx', build, params={'torch': torch.__version__}, suffix='.onnx')
+
+Entries are written to a temporary file and renamed into place, so an
+interrupted conversion never leaves a half-written artifact behind.  The
+cache lives in ``$JETRACER_CACHE_DIR`` (default ``~/.cache/jetracer``).
+"""
+import hashlib
+import json
+import os
+
+
+DEFAULT_DIRECTORY = os.environ.get('JETRACER_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'jetracer'))
+
+_digests = {}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha256 of a file's contents, remembered per process until the file changes."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        digest = _digests[key] = sha.hexdigest()
+    return digest
+
+
+def artifact_key(source, kind, params=None):
+    description = json.dumps({'source': file_digest(source), 'kind': kind, 'params': params or {}},
+                             sort_keys=True, default=str)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def artifact_path(source, kind, params=None, suffix='', directory=None):
+    return os.path.join(directory or DEFAULT_DIRECTORY,
+                        '%s-%s%s' % (kind, artifact_key(source, kind, params)[:24], suffix))
+
+
+def cached_artifact(source, kind, build, params=None, suffix='', directory=None):
+    """Return the cached artifact for ``source``, calling ``build(path)`` to create it on a miss.
+
+    ``params`` holds everything besides the source file that changes the
+    output (settings, library versions) and must be JSON serializable.
+    """
+    path = artifact_path(source, kind, params, suffix, directory)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = os.path.join(os.path.dirname(path), '.%d-%s' % (os.getpid(), os.path.basename(path)))
+    try:
+        build(temporary)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return path
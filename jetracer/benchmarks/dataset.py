@@ -0,0 +1,91 @@
+"""Compare training throughput of XYDataset (JPEG) against packed ShardDataset shards.
+
+    python -m jetracer.benchmarks.dataset --synthetic 2000 --workers 0 2 4
+    python -m jetracer.benchmarks.dataset --directory road_following_A --categories apex
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import torch
+import torch.utils.data
+import torchvision.transforms as transforms
+
+from jetracer.preprocess import IMAGENET_MEAN, IMAGENET_STD
+from jetracer.shards import ShardBatchTransform, ShardDataset, export_shards
+from jetracer.xy_dataset import XYDataset
+
+
+def make_synthetic_dataset(directory, count, categories, size=(224, 224)):
+    from jetracer.simulation import synthetic_frame
+    rng = np.random.default_rng(0)
+    dataset = XYDataset(directory, categories)
+    for i in range(count):
+        frame = synthetic_frame(i, *size)
+        frame[:, :, 2] = rng.integers(0, 256, size[::-1], dtype=np.uint8)
+        dataset.save_entry(categories[i % len(categories)], frame, int(rng.integers(0, size[0])),
+                           int(rng.integers(0, size[1])))
+    return dataset
+
+
+def samples_per_second(loader, epochs, batch_transform=None):
+    count = 0
+    start = time.perf_counter()
+    for _ in range(epochs):
+        for images, _, xy in loader:
+            if batch_transform is not None:
+                images, xy = batch_transform(images, xy)
+            count += images.shape[0]
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--directory', help='existing XYDataset directory')
+    parser.add_argument('--categories', nargs='+', default=['apex'])
+    parser.add_argument('--synthetic', type=int, default=0, help='generate a temporary dataset with this many images')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4])
+    parser.add_argument('--batch', type=int, default=64)
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--cache', type=int, default=0, help='XYDataset decoded-frame cache size')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='jetracer-bench-')
+    try:
+        if args.synthetic:
+            dataset = make_synthetic_dataset(os.path.join(scratch, 'dataset'), args.synthetic, args.categories)
+        elif args.directory:
+            dataset = XYDataset(args.directory, args.categories)
+        else:
+            parser.error('pass --directory or --synthetic')
+
+        shard_dir = os.path.join(scratch, 'shards')
+        start = time.perf_counter()
+        export_shards(dataset, shard_dir)
+        print('%d samples, exported shards in %.1f s' % (len(dataset), time.perf_counter() - start))
+
+        dataset = XYDataset(dataset.directory, args.categories, random_hflip=True, cache_size=args.cache,
+                            transform=transforms.Compose([
+                                transforms.Resize((224, 224)),
+                                transforms.ToTensor(),
+                                transforms.Normalize(list(IMAGENET_MEAN), list(IMAGENET_STD)),
+                            ]))
+        shards = ShardDataset(shard_dir)
+        batch_transform = ShardBatchTransform(args.batch, random_hflip=True)
+
+        for workers in args.workers:
+            jpeg = torch.utils.data.DataLoader(dataset, batch_size=args.batch, shuffle=True, num_workers=workers)
+            packed = torch.utils.data.DataLoader(shards, batch_size=args.batch, shuffle=True, num_workers=workers)
+            jpeg_rate = samples_per_second(jpeg, args.epochs)
+            shard_rate = samples_per_second(packed, args.epochs, batch_transform)
+            print('workers=%d  XYDataset %8.0f samples/s  ShardDataset %8.0f samples/s  %.1fx' % (
+                workers, jpeg_rate, shard_rate, shard_rate / jpeg_rate))
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
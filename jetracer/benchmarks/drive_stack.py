@@ -0,0 +1,200 @@
+"""End-to-end latency and throughput benchmark of the drive stack, without hardware.
+
+Frames from a synthetic camera (or a recorded session) go through
+JetRacerCamera, Preprocessor, an inference engine, DrivePipeline and an
+AsyncNvidiaRacecar on a simulated PCA9685 bus.
+
+    python -m jetracer.benchmarks.drive_stack run --duration 20 --output new.json
+    python -m jetracer.benchmarks.drive_stack compare old.json new.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+import torch
+
+from jetracer.camera_backends import SyntheticBackend
+from jetracer.camera_utils import JetRacerCamera
+from jetracer.drive_pipeline import DrivePipeline
+from jetracer.inference import EagerEngine, build_model, load_engine
+from jetracer.nvidia_racecar import AsyncNvidiaRacecar
+from jetracer.pca9685 import LED0_ON_L, SimulatedPCA9685Bus
+from jetracer.preprocess import Preprocessor
+
+
+# metrics where a larger value is an improvement; everything else is lower-is-better
+HIGHER_IS_BETTER = ('fps',)
+# reported for context but never flagged
+INFORMATIONAL = ('frames_captured', 'commands_coalesced')
+
+
+class CommandLog(object):
+    """Remembers capture and command time of every steering command the pipeline issues."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.captured = []
+        self.commanded = []
+
+    def __call__(self, packet, steering):
+        now = time.monotonic()
+        with self._lock:
+            self.captured.append(packet.timestamp)
+            self.commanded.append(now)
+
+
+def glass_to_actuator(commands, bus, address, channel):
+    """Capture-to-bus latency of every steering command that reached the servo.
+
+    A command reaches the bus with the first write to its channel after it
+    was issued, unless a newer command was issued before that write
+    (the actuator writer coalesced it away).
+    """
+    register = LED0_ON_L + 4 * channel
+    writes = np.array([t for t, a, r, n in list(bus.transactions)
+                       if a == address and r <= register < r + n])
+    captured = np.array(commands.captured)
+    commanded = np.array(commands.commanded)
+    if not len(writes) or not len(commanded):
+        return np.zeros(0), len(commanded)
+    index = np.searchsorted(writes, commanded)
+    landed = index < len(writes)
+    next_command = np.append(commanded[1:], np.inf)
+    landed[landed] &= writes[index[landed]] <= next_command[landed]
+    return writes[index[landed]] - captured[landed], int((~landed).sum())
+
+
+def percentile_metrics(prefix, values):
+    if not len(values):
+        return {}
+    return {'%s_p%d_ms' % (prefix, q): 1000 * float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+
+def run(args):
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.session:
+        from jetracer.recording import ReplayBackend
+        backend = ReplayBackend(args.session, realtime=True, loop=True)
+    else:
+        backend = SyntheticBackend(width=args.width, height=args.height, fps=args.fps)
+    engine = load_engine(args.model) if args.model else EagerEngine(build_model())
+    preprocess = Preprocessor(swap_rb=False)
+    bus = SimulatedPCA9685Bus(byte_time=args.byte_time)
+    car = AsyncNvidiaRacecar(bus=bus, max_update_rate=args.actuator_rate)
+    camera = JetRacerCamera('inference', backend=backend)
+    pipeline = DrivePipeline(camera, preprocess, engine, car)
+    commands = CommandLog()
+    pipeline.observe(commands)
+
+    camera.start()
+    for _ in range(3):
+        engine.predict(preprocess(camera.read()))
+    first_seq = camera.read_latest()[1]
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.monotonic()
+    pipeline.start()
+    time.sleep(args.duration)
+    pipeline.stop()
+    wall = time.monotonic() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    frames_captured = camera.read_latest()[1] - first_seq
+    stats = pipeline.stats()
+    car.close()
+    camera.stop()
+
+    latencies, coalesced = glass_to_actuator(commands, bus, car.i2c_address, car.steering_channel)
+    actuated = stats['stages']['actuation']['count']
+    metrics = {
+        'fps': actuated / wall,
+        'frames_captured': frames_captured,
+        'frames_dropped': max(0, frames_captured - actuated),
+        'commands_coalesced': coalesced,
+        'cpu_utilization': (usage_end.ru_utime + usage_end.ru_stime - usage_start.ru_utime - usage_start.ru_stime) / wall,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        'peak_rss_mb': usage_end.ru_maxrss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0),
+    }
+    for name in ('preprocess', 'inference', 'actuation'):
+        stage = pipeline.stages[[s.name for s in pipeline.stages].index(name)]
+        metrics.update(percentile_metrics('%s_latency' % name, np.array(stage.stats.latencies)))
+    metrics.update(percentile_metrics('frame_age', np.array(pipeline.frame_ages)))
+    metrics.update(percentile_metrics('glass_to_actuator', latencies))
+
+    result = {
+        'meta': {
+            'time': time.time(),
+            'source': args.session or 'synthetic %dx%d@%g' % (args.width, args.height, args.fps),
+            'model': args.model or 'eager resnet18 (random weights)',
+            'duration': args.duration,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'threads': torch.get_num_threads(),
+        },
+        'metrics': metrics,
+    }
+    for name in sorted(metrics):
+        print('%-28s %10.2f' % (name, metrics[name]))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print('wrote %s' % args.output)
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)['metrics']
+    with open(args.candidate) as f:
+        candidate = json.load(f)['metrics']
+    regressions = 0
+    print('%-28s %10s %10s %8s' % ('metric', 'baseline', 'candidate', 'change'))
+    for name in sorted(set(baseline) & set(candidate)):
+        old, new = baseline[name], candidate[name]
+        change = (new - old) / abs(old) if old else (0.0 if new == old else float('inf'))
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ''
+        if name in INFORMATIONAL or (name.endswith('_ms') and abs(new - old) < args.min_delta_ms):
+            pass
+        elif worse > args.threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print('%-28s %10.2f %10.2f %+7.1f%%%s' % (name, old, new, 100 * change, flag))
+    print('%d regression(s) above %.0f%%' % (regressions, 100 * args.threshold))
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the benchmark')
+    run_parser.add_argument('--duration', type=float, default=10.0)
+    run_parser.add_argument('--session', help='replay a recorded session instead of the synthetic camera')
+    run_parser.add_argument('--width', type=int, default=640)
+    run_parser.add_argument('--height', type=int, default=480)
+    run_parser.add_argument('--fps', type=float, default=21.0)
+    run_parser.add_argument('--model', help='checkpoint or exported artifact (see jetracer.inference.load_engine)')
+    run_parser.add_argument('--threads', type=int)
+    run_parser.add_argument('--actuator-rate', type=float, default=100.0)
+    run_parser.add_argument('--byte-time', type=float, default=22e-6, help='simulated I2C time per byte (s)')
+    run_parser.add_argument('--output', help='write results as JSON to this file')
+    compare_parser = commands.add_parser('compare', help='flag regressions between two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    compare_parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                                help='ignore latency changes smaller than this many milliseconds')
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
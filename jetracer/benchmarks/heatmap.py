@@ -0,0 +1,67 @@
+"""Compare batched HeatmapGenerator.generate_heatmaps against the per-point generator it replaces.
+
+    python -m jetracer.benchmarks.heatmap --keypoints 2
+"""
+import argparse
+import time
+
+import torch
+
+from jetracer.xy_dataset import HeatmapGenerator
+
+
+class LegacyHeatmapGenerator():
+    """``HeatmapGenerator`` as it was before the batched API."""
+
+    def __init__(self, shape, std):
+        self.shape = shape
+        self.std = std
+        self.idx0 = torch.linspace(-1.0, 1.0, self.shape[0]).reshape(self.shape[0], 1)
+        self.idx1 = torch.linspace(-1.0, 1.0, self.shape[1]).reshape(1, self.shape[1])
+
+    def generate_heatmap(self, xy):
+        x = xy[0]
+        y = xy[1]
+        heatmap = torch.zeros(self.shape)
+        heatmap -= (self.idx0 - y)**2 / (self.std**2)
+        heatmap -= (self.idx1 - x)**2 / (self.std**2)
+        heatmap = torch.exp(heatmap)
+        return heatmap
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shape', type=int, nargs=2, default=[224, 224])
+    parser.add_argument('--std', type=float, default=0.1)
+    parser.add_argument('--keypoints', type=int, default=1, help='keypoints (categories) per image')
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 4, 16, 64, 256])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    legacy = LegacyHeatmapGenerator(args.shape, args.std)
+    batched = HeatmapGenerator(args.shape, args.std)
+    for n in args.batches:
+        xy = torch.rand(n, args.keypoints, 2) * 2 - 1
+        out = torch.empty(n, args.keypoints, *args.shape)
+
+        def run_legacy():
+            return torch.stack([torch.stack([legacy.generate_heatmap(p) for p in points]) for points in xy])
+
+        error = (run_legacy() - batched.generate_heatmaps(xy)).abs().max().item()
+        t_legacy = best_of(run_legacy, args.repeat)
+        t_batched = best_of(lambda: batched.generate_heatmaps(xy, out=out), args.repeat)
+        print('N=%-4d K=%d  per-point %8.2f ms  batched %7.2f ms  %6.1fx  max abs diff %.1e' % (
+            n, args.keypoints, 1000 * t_legacy, 1000 * t_batched, t_legacy / t_batched, error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Compare synchronous XYDataset.save_entry against the background AsyncImageWriter.
+
+Frames are offered at a fixed capture rate, as a camera callback would;
+the caller's time per sample and the samples actually saved are reported.
+
+    python -m jetracer.benchmarks.image_writer --fps 60 --duration 5 --policy block drop_oldest
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from jetracer.camera_backends import Pacer
+from jetracer.image_writer import AsyncImageWriter
+from jetracer.simulation import synthetic_frame
+from jetracer.xy_dataset import XYDataset
+
+
+def capture(dataset, frames, fps, duration, writer=None):
+    pacer = Pacer(fps)
+    call_times = []
+    offered = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        pacer.wait()
+        t = time.perf_counter()
+        dataset.save_entry('apex', frames[offered % len(frames)], 112, 112, writer=writer)
+        call_times.append(time.perf_counter() - t)
+        offered += 1
+    capture_time = time.perf_counter() - start
+    if writer is not None:
+        writer.flush()
+    total_time = time.perf_counter() - start
+    call_times = np.array(call_times) * 1000
+    return {
+        'offered': offered,
+        'saved': dataset.get_count('apex'),
+        'offered_per_s': offered / capture_time,
+        'saved_per_s': dataset.get_count('apex') / total_time,
+        'call_p50_ms': float(np.percentile(call_times, 50)),
+        'call_p99_ms': float(np.percentile(call_times, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fps', type=float, default=60.0, help='capture rate to offer frames at (0: unpaced)')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--size', type=int, nargs=2, default=[640, 480])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue', type=int, default=64)
+    parser.add_argument('--policy', nargs='+', default=['block', 'drop_oldest', 'drop_newest'])
+    parser.add_argument('--no-fsync', action='store_true')
+    parser.add_argument('--directory', help='where to write (default: a temporary directory)')
+    args = parser.parse_args()
+
+    frames = [synthetic_frame(i, *args.size) for i in range(16)]
+    scratch = tempfile.mkdtemp(prefix='jetracer-bench-', dir=args.directory)
+    print('%-16s %8s %8s %10s %10s %10s %10s %6s' % ('writer', 'offered', 'saved', 'offered/s', 'saved/s',
+                                                     'call p50', 'call p99', 'depth'))
+    try:
+        for name in ['sync'] + args.policy:
+            dataset = XYDataset(os.path.join(scratch, name), ['apex'])
+            writer = None
+            if name != 'sync':
+                writer = AsyncImageWriter(max_queue=args.queue, workers=args.workers, policy=name,
+                                          fsync=not args.no_fsync)
+            result = capture(dataset, frames, args.fps, args.duration, writer)
+            depth = writer.stats()['max_queue_depth'] if writer is not None else 0
+            if writer is not None:
+                writer.close()
+            print('%-16s %8d %8d %10.1f %10.1f %10.2f %10.2f %6d' % (
+                name, result['offered'], result['saved'], result['offered_per_s'], result['saved_per_s'],
+                result['call_p50_ms'], result['call_p99_ms'], depth))
+            dataset.index.close()
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
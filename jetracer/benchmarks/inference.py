@@ -0,0 +1,80 @@
+"""Latency and accuracy drift of the CPU inference backends against the fp32 eager model.
+
+    python -m jetracer.benchmarks.inference --checkpoint road_following_model_cpu.pth --session sessions/lap1
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from jetracer.inference import ARTIFACTS, EagerEngine, build_model, export_artifacts, load_engine, load_model
+from jetracer.preprocess import Preprocessor
+
+
+def load_frames(session, count):
+    if session:
+        from jetracer.recording import SessionLog
+        log = SessionLog(session)
+        step = max(1, len(log) // count)
+        return [np.array(log[i]) for i in range(0, len(log), step)][:count]
+    from jetracer.simulation import synthetic_frame
+    return [synthetic_frame(i, 224, 224) for i in range(count)]
+
+
+def percentiles(values):
+    return tuple(1000 * np.percentile(values, q) for q in (50, 95, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checkpoint', help='state dict of the road following model (random weights if omitted)')
+    parser.add_argument('--session', help='recorded session to take frames from (synthetic frames if omitted)')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--calibration', type=int, default=32, help='frames used to calibrate static int8')
+    parser.add_argument('--formats', nargs='+', default=list(ARTIFACTS), choices=list(ARTIFACTS))
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    scratch = tempfile.mkdtemp(prefix='jetracer-bench-')
+    try:
+        checkpoint = args.checkpoint
+        if checkpoint is None:
+            checkpoint = os.path.join(scratch, 'random.pth')
+            torch.save(build_model().state_dict(), checkpoint)
+
+        preprocess = Preprocessor(swap_rb=False)
+        batches = [preprocess(frame).clone() for frame in load_frames(args.session, args.frames)]
+        paths = export_artifacts(checkpoint, os.path.join(scratch, 'artifacts'), args.formats,
+                                 calibration_batches=batches[:args.calibration])
+
+        engines = [EagerEngine(load_model(checkpoint))] + [load_engine(paths[name]) for name in args.formats]
+        names = ['eager_fp32'] + args.formats
+        baseline = None
+        print('%d frames from %s' % (len(batches), args.session or 'synthetic camera'))
+        print('%-14s %8s %8s %8s %12s %12s' % ('backend', 'p50 ms', 'p95 ms', 'p99 ms', 'mean drift', 'max drift'))
+        for name, engine in zip(names, engines):
+            for batch in batches[:5]:
+                engine.predict(batch)
+            latencies = []
+            outputs = []
+            for batch in batches:
+                start = time.perf_counter()
+                outputs.append(engine.predict(batch))
+                latencies.append(time.perf_counter() - start)
+            outputs = np.concatenate(outputs)
+            if baseline is None:
+                baseline = outputs
+            drift = np.abs(outputs - baseline)
+            print('%-14s %8.2f %8.2f %8.2f %12.2e %12.2e' % ((name,) + percentiles(latencies) + (drift.mean(), drift.max())))
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
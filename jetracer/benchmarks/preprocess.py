@@ -0,0 +1,101 @@
+"""Compare ``Preprocessor`` against the PIL based preprocessing it replaces.
+
+    python -m jetracer.benchmarks.preprocess --device cpu --dtype fp32
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+import PIL.Image
+import torch
+import torchvision.transforms as transforms
+
+from jetracer.preprocess import Preprocessor, IMAGENET_MEAN, IMAGENET_STD
+
+
+def make_legacy_preprocess(device):
+    """The per-frame path from ``notebooks/utils.py`` before ``Preprocessor``."""
+    mean = torch.Tensor(IMAGENET_MEAN).to(device)
+    std = torch.Tensor(IMAGENET_STD).to(device)
+
+    def preprocess(image):
+        image = PIL.Image.fromarray(image)
+        image = transforms.functional.to_tensor(image).to(device)
+        image.sub_(mean[:, None, None]).div_(std[:, None, None])
+        return image[None, ...]
+    return preprocess
+
+
+def make_compose_preprocess(device):
+    """The per-frame path from ``interactive_regression.ipynb``, which rebuilds the transform every call."""
+    def preprocess(image):
+        transform = transforms.Compose([
+            transforms.ToPILImage(),
+            transforms.Resize((224, 224)),
+            transforms.ToTensor(),
+            transforms.Normalize(list(IMAGENET_MEAN), list(IMAGENET_STD))
+        ])
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return transform(image).unsqueeze(0).to(device)
+    return preprocess
+
+
+def _sync(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def time_per_frame(fn, inputs, device, frames_per_call=1, warmup=10):
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    _sync(device)
+    start = time.perf_counter()
+    for item in inputs:
+        fn(item)
+    _sync(device)
+    return (time.perf_counter() - start) / (len(inputs) * frames_per_call)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--dtype', default='fp32', choices=['fp32', 'fp16'])
+    parser.add_argument('--width', type=int, default=224, help='width of the incoming camera frames')
+    parser.add_argument('--height', type=int, default=224, help='height of the incoming camera frames')
+    parser.add_argument('--frames', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=8)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(args.frames)]
+    batches = [np.stack(frames[i:i + args.batch]) for i in range(0, len(frames) - args.batch + 1, args.batch)]
+
+    single = Preprocessor(device=device, dtype=args.dtype, swap_rb=False)
+    batched = Preprocessor(device=device, dtype=args.dtype, swap_rb=False, max_batch=args.batch)
+    results = []
+    if (args.width, args.height) == (224, 224):
+        # the utils.preprocess path never resized, so it only applies to 224x224 frames
+        legacy = make_legacy_preprocess(device)
+        error = (legacy(frames[0]) - single(frames[0]).float()).abs().max().item()
+        results.append(('utils.preprocess (PIL)', time_per_frame(legacy, frames, device), error))
+    compose = make_compose_preprocess(device)
+    swapped = Preprocessor(device=device, dtype=args.dtype, swap_rb=True)
+    error = (compose(frames[0]) - swapped(frames[0]).float()).abs().max().item()
+    results.append(('Compose per call (PIL)', time_per_frame(compose, frames, device), error))
+    results.append(('Preprocessor', time_per_frame(single, frames, device), None))
+    results.append(('Preprocessor.batch(%d)' % args.batch,
+                    time_per_frame(batched.batch, batches, device, frames_per_call=args.batch), None))
+
+    baseline = results[0][1]
+    print('%dx%d frames on %s (%s)' % (args.width, args.height, device, args.dtype))
+    for name, seconds, error in results:
+        line = '%-26s %8.3f ms/frame  %6.1fx' % (name, 1000 * seconds, baseline / seconds)
+        if error is not None:
+            line += '  max abs diff vs Preprocessor %.2e' % error
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
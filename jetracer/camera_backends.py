@@ -0,0 +1,230 @@
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from .simulation import synthetic_frame
+from .tracing import tracer
+
+
+def fit_frame(image, out):
+    """Copy ``image`` into ``out``, resizing it if the sizes differ."""
+    h, w = out.shape[:2]
+    if image.shape[:2] == (h, w):
+        np.copyto(out, image)
+    else:
+        cv2.resize(image, (w, h), dst=out)
+
+
+class Pacer(object):
+    """Sleeps so that successive ``wait()`` calls return at most ``fps`` times a second.
+
+    An ``fps`` of None or 0 never sleeps.
+    """
+
+    def __init__(self, fps=None):
+        self.fps = fps
+        self._next_time = None
+
+    def reset(self):
+        self._next_time = None
+
+    def wait(self):
+        if not self.fps:
+            return
+        period = 1.0 / self.fps
+        now = time.monotonic()
+        if self._next_time is None:
+            self._next_time = now
+        if self._next_time > now:
+            time.sleep(self._next_time - now)
+            now = self._next_time
+        # don't try to catch up on frames missed while the caller was busy
+        self._next_time = max(self._next_time + period, now)
+
+
+class CameraBackend(object):
+    """Source of BGR frames for ``JetRacerCamera``.
+
+    ``grab()`` blocks until the next frame is available and returns it, or
+    returns None when the source failed or ran out of frames.
+    """
+
+    width = 640
+    height = 480
+    fps = 21
+
+    def open(self):
+        pass
+
+    def grab(self):
+        raise NotImplementedError
+
+    def grab_into(self, out):
+        """Grab the next frame into ``out`` (resized to fit); return the raw frame, or None like ``grab``.
+
+        Backends whose frames can change under the caller (``BrokerBackend``)
+        override this to copy straight from the source and validate the copy.
+        """
+        frame = self.grab()
+        if frame is not None:
+            with tracer.span('camera.resize'):
+                fit_frame(frame, out)
+        return frame
+
+    def close(self):
+        pass
+
+
+class CSIBackend(CameraBackend):
+    """The Jetson CSI camera through ``jetcam``."""
+
+    def __init__(self, width=640, height=480, fps=21):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.camera = None
+
+    def open(self):
+        from jetcam.csi_camera import CSICamera
+        self.camera = CSICamera(width=self.width, height=self.height, capture_fps=self.fps)
+
+    def grab(self):
+        return self.camera.read()
+
+    def close(self):
+        if self.camera is not None:
+            self.camera.cap.release()
+            self.camera = None
+
+
+class OpenCVBackend(CameraBackend):
+    """A V4L2 / USB camera (or anything else ``cv2.VideoCapture`` can open)."""
+
+    def __init__(self, device=0, width=640, height=480, fps=21):
+        self.device = device
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.cap = None
+
+    def open(self):
+        if isinstance(self.device, int) and sys.platform.startswith('linux'):
+            self.cap = cv2.VideoCapture(self.device, cv2.CAP_V4L2)
+        else:
+            self.cap = cv2.VideoCapture(self.device)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        if not self.cap.isOpened():
+            raise RuntimeError('could not open camera %r' % (self.device,))
+
+    def grab(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class FileBackend(CameraBackend):
+    """Plays back a directory of images or a video file.
+
+    Frames are paced to ``fps``; pass ``fps=None`` to read as fast as possible.
+    """
+
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+    def __init__(self, path, fps=21, loop=False):
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self._pacer = Pacer(fps)
+        self._paths = None
+        self._index = 0
+        self.cap = None
+        if os.path.isdir(path):
+            self._paths = sorted(p for p in glob.glob(os.path.join(path, '*'))
+                                 if p.lower().endswith(self.IMAGE_EXTENSIONS))
+            if not self._paths:
+                raise ValueError('no images found in %s' % path)
+            first = cv2.imread(self._paths[0], cv2.IMREAD_COLOR)
+            self.height, self.width = first.shape[:2]
+
+    def open(self):
+        self._index = 0
+        self._pacer.reset()
+        if self._paths is None:
+            self.cap = cv2.VideoCapture(self.path)
+            if not self.cap.isOpened():
+                raise RuntimeError('could not open %s' % self.path)
+            self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    def _next_frame(self):
+        if self._paths is not None:
+            if self._index >= len(self._paths):
+                return None
+            frame = cv2.imread(self._paths[self._index], cv2.IMREAD_COLOR)
+            self._index += 1
+            return frame
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def grab(self):
+        self._pacer.wait()
+        frame = self._next_frame()
+        if frame is None and self.loop:
+            self._index = 0
+            if self.cap is not None:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            frame = self._next_frame()
+        return frame
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class SyntheticBackend(CameraBackend):
+    """Generated frames from ``jetracer.simulation.synthetic_frame``; needs no hardware."""
+
+    def __init__(self, width=640, height=480, fps=21):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self._pacer = Pacer(fps)
+        self._index = 0
+
+    def open(self):
+        self._index = 0
+        self._pacer.reset()
+
+    def grab(self):
+        self._pacer.wait()
+        frame = synthetic_frame(self._index, self.width, self.height)
+        self._index += 1
+        return frame
+
+
+BACKENDS = {
+    'csi': CSIBackend,
+    'opencv': OpenCVBackend,
+    'v4l2': OpenCVBackend,
+    'synthetic': SyntheticBackend,
+}
+
+
+def make_backend(backend=None):
+    """Return a backend instance from an instance, a name in ``BACKENDS`` or None (CSI)."""
+    if backend is None:
+        return CSIBackend()
+    if isinstance(backend, str):
+        return BACKENDS[backend]()
+    return backend
@@ -0,0 +1,390 @@
+"""One process owns the camera; any number of local processes read its frames.
+
+``CameraBroker`` opens a backend (the CSI camera by default) and copies
+every frame into a ring of slots in POSIX shared memory
+(``multiprocessing.shared_memory``, Python 3.8+).  Other processes attach
+with ``BrokerBackend``, which is a regular camera backend, so data
+collection, the live preview and the drive loop can each run their own
+``JetRacerCamera`` at their own rate and resolution::
+
+    # process 1 (or: python -m jetracer.camera_broker --backend csi)
+    broker = CameraBroker('csi')
+    broker.start()
+
+    # any other process
+    camera = JetRacerCamera('inference', backend=BrokerBackend())
+    camera.start()
+
+Slots are guarded seqlock-style: the broker stamps a slot's ``begin``
+sequence number before it overwrites the pixels and its ``end`` number
+afterwards, so a reader can tell whether a frame was complete and whether
+it has been overwritten since.  ``BrokerBackend`` copies each frame
+straight into the reading camera's ring and re-checks ``begin``
+afterwards, so a reader makes one copy and never sees a torn frame.
+There is no cross-process condition variable; readers poll the published
+sequence number every ``poll_interval`` seconds.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from .camera_backends import CameraBackend, fit_frame, make_backend
+from .tracing import tracer
+
+
+DEFAULT_NAME = 'jetracer-camera'
+
+MAGIC = 0x4a524342  # 'JRCB'
+VERSION = 1
+
+HEADER_DTYPE = np.dtype([
+    ('magic', '<u4'), ('version', '<u4'), ('pid', '<i4'), ('closed', '<i4'),
+    ('slots', '<i4'), ('height', '<i4'), ('width', '<i4'), ('channels', '<i4'),
+    ('seq', '<i8'), ('fps', '<f8'),
+])
+SLOT_DTYPE = np.dtype([('begin', '<i8'), ('end', '<i8'), ('timestamp', '<f8')])
+
+_ALIGN = 64
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _layout(slots, shape):
+    slots_offset = _aligned(HEADER_DTYPE.itemsize)
+    frames_offset = _aligned(slots_offset + slots * SLOT_DTYPE.itemsize)
+    return slots_offset, frames_offset, frames_offset + slots * int(np.prod(shape))
+
+
+class _Segment(object):
+    """Read-write mapping of an existing shared memory segment that no resource tracker knows about."""
+
+    def __init__(self, name):
+        import _posixshmem
+        import mmap
+        fd = _posixshmem.shm_open('/' + name, os.O_RDWR, mode=0o600)
+        try:
+            self._mmap = mmap.mmap(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        self.name = name
+        self.buf = memoryview(self._mmap)
+
+    def close(self):
+        self.buf.release()
+        self._mmap.close()
+
+
+def _open_shared_memory(name):
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13 SharedMemory registers every attach with the
+        # resource tracker, which unlinks the segment when the process exits;
+        # unregistering afterwards is no good either, because fork-started
+        # readers share the broker's tracker.  Map it ourselves instead.
+        return _Segment(name)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedFrameRing(object):
+    """Ring of frames in a named shared memory segment; see the module docstring for the protocol.
+
+    Use ``create`` in the writing process and ``attach`` in readers.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+        if self.header['magic'] != MAGIC or self.header['version'] != VERSION:
+            raise RuntimeError('%s is not a jetracer camera broker segment' % shm.name)
+        self.size = int(self.header['slots'])
+        shape = (int(self.header['height']), int(self.header['width']), int(self.header['channels']))
+        slots_offset, frames_offset, _ = _layout(self.size, shape)
+        self.slots = np.ndarray((self.size,), SLOT_DTYPE, buffer=shm.buf, offset=slots_offset)
+        self.frames = np.ndarray((self.size,) + shape, np.uint8, buffer=shm.buf, offset=frames_offset)
+
+    @classmethod
+    def create(cls, name, slots, shape, fps=0.0):
+        from multiprocessing import shared_memory
+        _, _, nbytes = _layout(slots, shape)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        except FileExistsError:
+            stale = _open_shared_memory(name)
+            header = np.ndarray((), HEADER_DTYPE, buffer=stale.buf)
+            pid = int(header['pid'])
+            del header
+            if pid != os.getpid() and _pid_alive(pid):
+                stale.close()
+                raise RuntimeError('a camera broker (pid %d) is already publishing to %s' % (pid, name))
+            # left behind by a broker that crashed; reopen it tracked so unlink() can unregister it
+            stale.close()
+            shared_memory.SharedMemory(name=name).unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        header = np.ndarray((), HEADER_DTYPE, buffer=shm.buf)
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['pid'] = os.getpid()
+        header['slots'] = slots
+        header['height'], header['width'], header['channels'] = shape
+        header['seq'] = -1
+        header['fps'] = fps
+        del header
+        ring = cls(shm, owner=True)
+        ring.slots['begin'] = -1
+        ring.slots['end'] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_open_shared_memory(name), owner=False)
+
+    @property
+    def shape(self):
+        return self.frames.shape[1:]
+
+    @property
+    def seq(self):
+        return int(self.header['seq'])
+
+    @property
+    def closed(self):
+        return bool(self.header['closed'])
+
+    def write(self, frame, timestamp):
+        """Copy ``frame`` into the next slot and publish it (broker only)."""
+        seq = self.seq + 1
+        index = seq % self.size
+        slot = self.slots[index:index + 1]
+        slot['begin'] = seq
+        fit_frame(frame, self.frames[index])
+        slot['timestamp'] = timestamp
+        slot['end'] = seq
+        self.header['seq'] = seq
+        return seq
+
+    def entry(self, seq):
+        """``(frame, seq, timestamp)`` for ``seq`` if that frame is complete and still in the ring."""
+        if seq < 0:
+            return None
+        index = seq % self.size
+        if self.slots['end'][index] != seq:
+            return None
+        timestamp = float(self.slots['timestamp'][index])
+        if not self.valid(seq):
+            return None
+        return self.frames[index], seq, timestamp
+
+    def valid(self, seq):
+        """True while frame ``seq`` has not started being overwritten."""
+        return self.slots['begin'][seq % self.size] == seq
+
+    def latest(self):
+        return self.entry(self.seq)
+
+    def wait_newer_than(self, seq, timeout=None, poll_interval=0.001):
+        """Poll until a frame newer than ``seq`` is published; None on timeout or when the broker closes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            newest = self.seq
+            if newest > seq:
+                entry = self.entry(newest)
+                if entry is not None:
+                    return entry
+            if self.closed or (deadline is not None and time.monotonic() >= deadline):
+                return None
+            time.sleep(poll_interval)
+
+    def close(self):
+        if self.owner:
+            self.header['closed'] = 1
+        self.header = self.slots = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # a caller still holds a frame view; the mapping goes away with it
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+class CameraBroker(object):
+    """Captures from ``backend`` on a background thread and publishes into a ``SharedFrameRing``.
+
+    ``backend`` is anything ``make_backend`` accepts.  Frames are published
+    at the backend's native resolution; readers resize for themselves.
+    """
+
+    def __init__(self, backend=None, name=DEFAULT_NAME, slots=8):
+        self.backend = make_backend(backend)
+        self.name = name
+        self.slots = slots
+        self.ring = None
+        self.frame_count = 0
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        self.backend.open()
+        first = self.backend.grab()
+        if first is None:
+            self.backend.close()
+            raise RuntimeError('camera returned no frame')
+        self.ring = SharedFrameRing.create(self.name, self.slots, first.shape, fps=self.backend.fps or 0.0)
+        self.ring.write(first, time.monotonic())
+        self.frame_count = 1
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='jetracer-camera-broker', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            try:
+                with tracer.span('broker.grab'):
+                    frame = self.backend.grab()
+            except Exception as e:
+                print(f"Error reading from camera: {e}")
+                frame = None
+            if frame is None:
+                time.sleep(0.01)
+                continue
+            timestamp = time.monotonic()
+            with tracer.span('broker.publish'):
+                self.ring.write(frame, timestamp)
+            self.frame_count += 1
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.backend.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class BrokerBackend(CameraBackend):
+    """Camera backend that reads frames published by a ``CameraBroker``.
+
+    ``open`` waits up to ``timeout`` seconds for the broker to appear.
+    ``grab_into(out)``, which ``JetRacerCamera`` uses, copies the newest
+    frame not returned before straight from shared memory into the camera's
+    own ring slot, resizing it to fit, and only returns once it has checked
+    that the broker did not start overwriting the slot during the copy.
+    That single copy is all a reader pays.  ``grab`` does the same into a
+    private ``width``x``height`` buffer.  Both return None once the broker
+    has gone away.  Code that can tolerate a view that may be overwritten
+    can use ``ring.entry(seq)`` and ``ring.valid(seq)`` directly.
+    """
+
+    def __init__(self, name=DEFAULT_NAME, width=None, height=None, timeout=5.0, poll_interval=0.001):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.ring = None
+        self.timestamp = None
+        self._seq = -1
+        self._buffer = None
+        self._requested = (width, height)
+        try:
+            ring = SharedFrameRing.attach(name)
+        except FileNotFoundError:
+            return
+        self._apply_header(ring)
+        ring.close()
+
+    def _apply_header(self, ring):
+        height, width = ring.shape[:2]
+        self.width = self._requested[0] or width
+        self.height = self._requested[1] or height
+        self.fps = float(ring.header['fps']) or self.fps
+
+    def open(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self.ring = SharedFrameRing.attach(self.name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError('no camera broker is publishing to %s' % self.name)
+                time.sleep(0.05)
+        self._apply_header(self.ring)
+        self._seq = self.ring.seq - 1
+
+    def grab_into(self, out):
+        while True:
+            entry = self.ring.wait_newer_than(self._seq, self.timeout, self.poll_interval)
+            if entry is None:
+                return None
+            frame, self._seq, self.timestamp = entry
+            with tracer.span('camera.resize'):
+                fit_frame(frame, out)
+            # otherwise the broker lapped us while copying; take the newest frame instead
+            if self.ring.valid(self._seq):
+                return frame
+
+    def grab(self):
+        if self._buffer is None or self._buffer.shape[:2] != (self.height, self.width):
+            self._buffer = np.empty((self.height, self.width) + self.ring.shape[2:], np.uint8)
+        if self.grab_into(self._buffer) is None:
+            return None
+        return self._buffer
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Share one camera with other processes through shared memory.')
+    parser.add_argument('--backend', default='csi', help='camera backend (see jetracer.camera_backends.BACKENDS)')
+    parser.add_argument('--name', default=DEFAULT_NAME)
+    parser.add_argument('--slots', type=int, default=8)
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between frame rate reports')
+    args = parser.parse_args()
+
+    broker = CameraBroker(args.backend, name=args.name, slots=args.slots).start()
+    print('publishing %dx%d frames to /dev/shm/%s' % (broker.ring.shape[1], broker.ring.shape[0], args.name))
+    try:
+        count = broker.frame_count
+        while True:
+            time.sleep(args.interval)
+            print('%.1f fps' % ((broker.frame_count - count) / args.interval), flush=True)
+            count = broker.frame_count
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.stop()
+
+
+if __name__ == '__main__':
+    main()
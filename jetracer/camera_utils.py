@@ -1,54 +1,165 @@
-from jetcam.csi_camera import CSICamera
-
-from jetcam.csi_camera import CSICamera
-import cv2
+import threading
+import numpy as np
 import time
 
+from .camera_backends import make_backend
+from .tracing import tracer
+
+
+class FrameRing:
+    """Fixed-size ring of preallocated frames tagged with sequence numbers and capture timestamps.
+
+    A single writer fills ``next_slot()`` in place and then calls ``publish``.
+    ``next_slot`` retires the slot's old frame first, so ``get`` never
+    returns a frame that is being overwritten.  Views already handed out
+    stay valid until the writer wraps around to them, i.e. for ``size - 2``
+    further frames while a write is in progress.
+    """
+
+    def __init__(self, size, shape):
+        self.size = size
+        self.frames = np.zeros((size,) + tuple(shape), dtype=np.uint8)
+        self.timestamps = np.zeros(size, dtype=np.float64)
+        self.seqs = np.full(size, -1, dtype=np.int64)
+        self._seq = -1
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def shape(self):
+        return self.frames.shape[1:]
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def next_slot(self):
+        index = (self._seq + 1) % self.size
+        with self._cond:
+            self.seqs[index] = -1
+        return self.frames[index]
+
+    def publish(self, timestamp):
+        with self._cond:
+            seq = self._seq + 1
+            index = seq % self.size
+            self.timestamps[index] = timestamp
+            self.seqs[index] = seq
+            self._seq = seq
+            self._cond.notify_all()
+        return seq
+
+    def _entry(self, seq):
+        index = seq % self.size
+        return self.frames[index], seq, self.timestamps[index]
+
+    def latest(self):
+        """Return ``(frame, seq, timestamp)`` for the newest frame, or None before the first one."""
+        with self._cond:
+            if self._seq < 0:
+                return None
+            return self._entry(self._seq)
+
+    def get(self, seq):
+        """Return ``(frame, seq, timestamp)`` for frame ``seq`` if it is still in the ring, else None."""
+        with self._cond:
+            if seq < 0 or self.seqs[seq % self.size] != seq:
+                return None
+            return self._entry(seq)
+
+    def wait_newer_than(self, seq, timeout=None):
+        """Block until a frame newer than ``seq`` is published; return it like ``latest()``.
+
+        Returns None on timeout or once the ring has been closed.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._seq > seq, timeout)
+            if self._closed or self._seq <= seq:
+                return None
+            return self._entry(self._seq)
+
+    def open(self):
+        with self._cond:
+            self._closed = False
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
 class JetRacerCamera:
-    """wroking sets"""
+    """Camera that captures on a background thread into a ring of already resized frames.
+
+    ``backend`` is a ``jetracer.camera_backends.CameraBackend`` instance or one
+    of the names in ``camera_backends.BACKENDS``; the default is the CSI camera.
+    Frames returned by ``read``/``value``/``read_newer_than`` are zero-copy
+    views into the ring and are only valid for ``ring_size - 2`` further
+    frames; copy them to keep them longer.
+    """
     
-    def __init__(self, mode='inference'):
-        
-        from jetcam.csi_camera import CSICamera
+    def __init__(self, mode='inference', backend=None, ring_size=4):
         
         if mode == 'inference':
-            self.camera = CSICamera(width=640, height=480, capture_fps=21)
             self.target_size = (224, 224)
             self.mode = 'inference'
         elif mode == 'training':
-            self.camera = CSICamera(width=640, height=480, capture_fps=21)
             self.target_size = (224, 224) 
             self.mode = 'training'
         elif mode == 'safe':
-            self.camera = CSICamera(width=640, height=480, capture_fps=21)
             self.target_size = None 
             self.mode = 'safe'
         else:
-            self.camera = CSICamera(width=640, height=480, capture_fps=21)
             self.target_size = (224, 224)
             self.mode = 'default'
         
+        self.backend = make_backend(backend)
+        self.ring_size = ring_size
+        self.ring = None
+        self._raw = None
+        self._callbacks = []
+        self._thread = None
         self._running = False
         print(f"created in '{mode}' mode")
         if self.target_size:
-            print(f"resizingm 640x480 to {self.target_size[0]}x{self.target_size[1]}")
+            print(f"resizing {self.backend.width}x{self.backend.height} to {self.target_size[0]}x{self.target_size[1]}")
     
-    def start(self):
+    @property
+    def camera(self):
+        return self.backend
+    
+    def start(self, timeout=10.0):
+        """Start capturing and return once the first frame has arrived (False after ``timeout`` seconds).
+
+        Opening the camera is retried with a short backoff for as long as
+        ``timeout`` allows, so a device another camera object has only just
+        released doesn't need a fixed sleep before ``start``.
+        """
         try:            
             if self._running:
                 self.stop()
-                time.sleep(1)
             
-            self.camera.running = True
+            deadline = time.monotonic() + timeout
+            self._open_backend(deadline)
+            width, height = self.target_size or (self.backend.width, self.backend.height)
+            if self.ring is None or self.ring.shape != (height, width, 3):
+                self.ring = FrameRing(self.ring_size, (height, width, 3))
+            self.ring.open()
+            last_seq = self.ring.seq
             self._running = True
-            time.sleep(3)
+            self._thread = threading.Thread(target=self._capture_loop, name='jetracer-camera', daemon=True)
+            self._thread.start()
+            if self.ring.wait_newer_than(last_seq, max(0.0, deadline - time.monotonic())) is None:
+                print(f"no frame within {timeout:g}s")
+                self.stop()
+                return False
             
-            test_image = self.camera.value
+            test_image = self.raw_value
             if test_image is not None:
                 print(f"started")
                 print(f"shape:  {test_image.shape}")
                 
-                processed = self._process_image(test_image)
+                processed = self.read()
                 if processed is not None:
                     print(f"image shape after procesing: {processed.shape}")
                     return True
@@ -62,41 +173,91 @@ class JetRacerCamera:
             print(f"failed: {e}")
             return False
     
+    def _open_backend(self, deadline):
+        delay = 0.05
+        while True:
+            try:
+                self.backend.open()
+                return
+            except Exception:
+                try:
+                    self.backend.close()
+                except Exception:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise
+                time.sleep(min(delay, remaining))
+                delay = min(2 * delay, 0.5)
+    
     def stop(self):
         try:
-            if hasattr(self, 'camera') and self.camera:
-                self.camera.running = False
+            if self._running or self._thread is not None:
                 self._running = False
-                time.sleep(1)
+                if self._thread is not None:
+                    self._thread.join()
+                    self._thread = None
+                self.backend.close()
                 print("stopped")
         except Exception as e:
+            print(f"failed to stop: {e}")
     
-    def _process_image(self, image):
-        if image is None:
-            return None
-        
-        if self.target_size:
+    def _capture_loop(self):
+        while self._running:
             try:
-                resized = cv2.resize(image, self.target_size)
-                return resized
+                with tracer.span('camera.grab'):
+                    raw_image = self.backend.grab_into(self.ring.next_slot())
             except Exception as e:
-                print(f"failed resizeing {e}")
-                return image
-        
-        return image
+                print(f"Error reading from camera: {e}")
+                raw_image = None
+            if raw_image is None:
+                if not self._running:
+                    break
+                time.sleep(0.01)
+                continue
+            timestamp = time.monotonic()
+            self._raw = raw_image
+            seq = self.ring.publish(timestamp)
+            if self._callbacks:
+                frame = self.ring.frames[seq % self.ring.size]
+                change = {'name': 'value', 'old': None, 'new': frame, 'owner': self, 'type': 'change',
+                          'seq': seq, 'timestamp': timestamp}
+                for callback in list(self._callbacks):
+                    try:
+                        callback(change)
+                    except Exception as e:
+                        print(f"camera callback failed: {e}")
+        self.ring.close()
     
     def read(self):
-        try:
-            if not self._running:
-                print("cam off")
-                return None
-            
-            raw_image = self.camera.value
-            return self._process_image(raw_image)
-            
-        except Exception as e:
-            print(f"Error reading from camera: {e}")
+        """Return the newest frame (a view into the ring), or None if no frame has arrived yet."""
+        if not self._running:
+            print("cam off")
+            return None
+        entry = self.ring.latest()
+        return None if entry is None else entry[0]
+    
+    def read_latest(self):
+        """Return ``(frame, seq, timestamp)`` for the newest frame, or None."""
+        if self.ring is None:
+            return None
+        return self.ring.latest()
+    
+    def read_seq(self, seq):
+        """Return ``(frame, seq, timestamp)`` for frame ``seq`` while it is still in the ring, else None."""
+        if self.ring is None:
             return None
+        return self.ring.get(seq)
+    
+    def read_newer_than(self, seq, timeout=None):
+        """Block until a frame with sequence number greater than ``seq`` arrives.
+
+        Returns ``(frame, seq, timestamp)`` with ``timestamp`` on the
+        ``time.monotonic()`` clock, or None on timeout or if the camera stops.
+        """
+        if self.ring is None or not self._running:
+            return None
+        return self.ring.wait_newer_than(seq, timeout)
     
     @property
     def value(self):
@@ -104,9 +265,7 @@ class JetRacerCamera:
     
     @property
     def raw_value(self):
-        if hasattr(self.camera, 'value'):
-            return self.camera.value
-        return None
+        return self._raw
     
     @property
     def running(self):
@@ -114,30 +273,27 @@ class JetRacerCamera:
     
     @property
     def width(self):
-        return self.target_size[0] if self.target_size else 640
+        return self.target_size[0] if self.target_size else self.backend.width
     
     @property
     def height(self):
-        return self.target_size[1] if self.target_size else 480
+        return self.target_size[1] if self.target_size else self.backend.height
     
     def observe(self, callback, names='value'):
-        if hasattr(self.camera, 'observe'):
-            def wrapped_callback(change):
-                if 'new' in change:
-                    processed = self._process_image(change['new'])
-                    new_change = change.copy()
-                    new_change['new'] = processed
-                    callback(new_change)
-                else:
-                    callback(change)
-            
-            return self.camera.observe(wrapped_callback, names=names)
-        return None
+        """Call ``callback`` from the capture thread for every new frame.
+
+        The argument is a traitlets-style change dict with the frame in
+        ``'new'`` plus its ``'seq'`` and ``'timestamp'``.
+        """
+        self._callbacks.append(callback)
+    
+    def unobserve(self, callback, names='value'):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
     
     def unobserve_all(self):
         """Unobserve all callbacks"""
-        if hasattr(self.camera, 'unobserve_all'):
-            return self.camera.unobserve_all()
+        self._callbacks = []
 
 def test_jetracer_camera():
     modes = ['safe', 'training', 'inference']
@@ -150,10 +306,13 @@ def test_jetracer_camera():
                 for i in range(3):
                     img = cam.read()
                     if img is not None:
+                        print(f"✓ frame {i}: {img.shape}")
                     else:
+                        print(f"✗ frame {i}: no image")
                     time.sleep(0.5)
                 cam.stop()
             else:
+                print(f"✗ {mode} mode failed to start")
             time.sleep(2)
         except Exception as e:
             print(f"✗ {mode} mode error: {e}")
@@ -196,18 +355,13 @@ def release_all_cameras():
     
     gc.collect()
     
-    time.sleep(3)
-    
     print("released")
 
 def quick_camera_test():
     try:
         from jetcam.csi_camera import CSICamera
         test_cam = CSICamera(width=640, height=480, capture_fps=21)
-        test_cam.running = True
-        time.sleep(2)
-        
-        img = test_cam.value
+        img = test_cam.read()
         if img is not None:
             result = True
         else:
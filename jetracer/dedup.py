@@ -0,0 +1,272 @@
+"""Find near-duplicate training frames and write a deduplicated manifest for ``XYDataset``.
+
+Every image gets a 64-bit difference hash (dHash): the frame is decoded at
+1/8 scale in grayscale, shrunk to 9x8 and each bit says whether a pixel is
+brighter than its right neighbour.  Hashes are computed for all images at
+once with NumPy and cached in ``dedup_hashes.npz`` next to the annotation
+index, so re-running only hashes new images.
+
+Two frames are near duplicates when they are in the same category, their
+labels fall in the same ``label_tolerance`` pixel cell and their hashes
+differ in at most ``max_distance`` bits.  Instead of comparing all pairs,
+the hash is split into ``max_distance + 1`` bands: by the pigeonhole
+principle two hashes that close agree exactly on at least one band, so
+only frames sharing a band value are compared.  Matches are merged with
+union-find and the earliest frame of each cluster is kept::
+
+    python -m jetracer.dedup road_following_A --categories apex --measure
+    dataset = XYDataset('road_following_A', ['apex'], transform, manifest='road_following_A/dedup_manifest.json')
+"""
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from .annotation_index import AnnotationIndex
+
+
+HASHES_FILE = 'dedup_hashes.npz'
+MANIFEST_FILE = 'dedup_manifest.json'
+
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(values):
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8).reshape(values.shape + (8,))].sum(axis=-1, dtype=np.uint8)
+
+
+def load_thumbnail(path):
+    """Grayscale 9x8 thumbnail; JPEGs are decoded at 1/8 scale so this is much cheaper than a full decode."""
+    image = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    return cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+
+
+def dhash(thumbnails):
+    """64-bit difference hashes of an Nx8x9 uint8 stack of thumbnails."""
+    thumbnails = np.asarray(thumbnails)
+    bits = thumbnails[:, :, 1:] > thumbnails[:, :, :-1]
+    return np.packbits(bits.reshape(len(thumbnails), 64), axis=1).view('>u8').reshape(-1).astype(np.uint64)
+
+
+def hash_images(paths, workers=4):
+    """dHash every image in ``paths`` (decoded on ``workers`` threads); unreadable images hash to 0."""
+    from concurrent.futures import ThreadPoolExecutor
+    if not len(paths):
+        return np.zeros(0, dtype=np.uint64)
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        thumbnails = list(pool.map(load_thumbnail, paths))
+    blank = np.zeros((8, 9), dtype=np.uint8)
+    return dhash(np.stack([blank if t is None else t for t in thumbnails]))
+
+
+def _names(index):
+    return [index.categories[c] + '/' + f for c, f in zip(index.category_index[:len(index)], index.filenames)]
+
+
+def index_hashes(index, workers=4, cache=True):
+    """Hashes for every row of an ``AnnotationIndex``, reusing the cached ones for images seen before."""
+    names = _names(index)
+    cache_path = os.path.join(index.directory, HASHES_FILE)
+    known = {}
+    if cache and os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            known = dict(zip(cached['names'].tolist(), cached['hashes'].tolist()))
+    hashes = np.zeros(len(names), dtype=np.uint64)
+    missing = []
+    for i, name in enumerate(names):
+        value = known.get(name)
+        if value is None:
+            missing.append(i)
+        else:
+            hashes[i] = value
+    if missing:
+        hashes[missing] = hash_images([index.image_path(i) for i in missing], workers)
+        if cache:
+            np.savez(cache_path, names=np.array(names), hashes=hashes)
+    return hashes
+
+
+class UnionFind(object):
+
+    def __init__(self, size):
+        self.parent = np.arange(size)
+
+    def find(self, i):
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            # the lower index (earlier frame) becomes the root
+            self.parent[max(a, b)] = min(a, b)
+
+    def roots(self):
+        # pointer jumping: every element ends up pointing straight at its root
+        parent = self.parent
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                return parent.astype(np.int64)
+            parent = grandparent
+
+
+def _runs(*keys):
+    """Sort by ``keys`` (last one primary) and return ``(order, starts, ends)`` of runs of equal keys longer than 1."""
+    order = np.lexsort(keys)
+    changed = np.zeros(len(order), dtype=bool)
+    if len(order):
+        changed[0] = True
+        for key in keys:
+            changed[1:] |= key[order][1:] != key[order][:-1]
+    starts = np.flatnonzero(changed)
+    ends = np.append(starts[1:], len(order))
+    long_runs = ends - starts > 1
+    return order, starts[long_runs], ends[long_runs]
+
+
+def cluster(hashes, groups=None, max_distance=3, chunk=1024, small_bucket=32):
+    """Cluster id (index of the earliest member) of every hash.
+
+    Items are only merged within the same ``groups`` value and when their
+    hashes are at most ``max_distance`` bits apart.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    groups = np.zeros(len(hashes), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    uf = UnionFind(len(hashes))
+    # identical hashes first, so the band search only sees one representative of each
+    order, starts, ends = _runs(hashes, groups)
+    representative = np.ones(len(hashes), dtype=bool)
+    for start, end in zip(starts, ends):
+        members = order[start:end]
+        for member in members[1:]:
+            uf.union(members[0], member)
+        representative[members[1:]] = False
+    reps = np.flatnonzero(representative)
+    rep_hashes = hashes[reps]
+    rep_groups = groups[reps]
+
+    bands = max_distance + 1
+    width = 64 // bands
+    for band in range(bands):
+        shift = np.uint64(band * width)
+        bits = 64 - band * width if band == bands - 1 else width
+        mask = np.uint64((1 << bits) - 1)
+        values = (rep_hashes >> shift) & mask
+        order, starts, ends = _runs(values, rep_groups)
+        small = ends - starts <= small_bucket
+        # small buckets, all at once: compare every member with the one d places after it
+        lengths = (ends - starts)[small]
+        if len(lengths):
+            positions = np.repeat(starts[small] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            run_end = np.repeat(ends[small], lengths)
+            for d in range(1, int(lengths.max())):
+                valid = positions + d < run_end
+                a = reps[order[positions[valid]]]
+                b = reps[order[positions[valid] + d]]
+                close = popcount64(hashes[a] ^ hashes[b]) <= max_distance
+                for i, j in zip(a[close], b[close]):
+                    uf.union(i, j)
+        for start, end in zip(starts[~small], ends[~small]):
+            members = reps[order[start:end]]
+            member_hashes = hashes[members]
+            for offset in range(0, len(members), chunk):
+                block = member_hashes[offset:offset + chunk]
+                distances = popcount64(block[:, None] ^ member_hashes[None, :])
+                rows, cols = np.nonzero(distances <= max_distance)
+                for row, col in zip(rows + offset, cols):
+                    if row < col:
+                        uf.union(members[row], members[col])
+    return uf.roots()
+
+
+def find_duplicates(index, max_distance=3, label_tolerance=8, workers=4, cache=True):
+    """Return ``(keep, clusters)``: a boolean mask of rows to keep and the cluster id of every row."""
+    hashes = index_hashes(index, workers, cache)
+    category_index, xs, ys = index.labels()
+    cells = 1 + 4096 // max(1, label_tolerance)
+    groups = (category_index.astype(np.int64) * cells + xs // max(1, label_tolerance)) * cells \
+        + ys // max(1, label_tolerance)
+    clusters = cluster(hashes, groups, max_distance)
+    return clusters == np.arange(len(clusters)), clusters
+
+
+def write_manifest(index, keep, path, **settings):
+    names = _names(index)
+    manifest = {'version': 1, 'source_count': len(names), 'settings': settings,
+                'keep': [name for name, kept in zip(names, keep) if kept]}
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+    return manifest
+
+
+def load_manifest(path):
+    """Set of ``category/filename`` entries kept by a dedup manifest."""
+    with open(path) as f:
+        return set(json.load(f)['keep'])
+
+
+def _epoch_seconds(dataset, batch_size, workers):
+    import torch.utils.data
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, num_workers=workers)
+    start = time.perf_counter()
+    for _ in loader:
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', help='XYDataset directory')
+    parser.add_argument('--categories', nargs='+', required=True)
+    parser.add_argument('--max-distance', type=int, default=3, help='largest hamming distance between duplicates')
+    parser.add_argument('--label-tolerance', type=int, default=8, help='label cell size in pixels')
+    parser.add_argument('--output', help='manifest path (default: <directory>/%s)' % MANIFEST_FILE)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--measure', action='store_true', help='time one epoch with and without the manifest')
+    args = parser.parse_args()
+    output = args.output or os.path.join(args.directory, MANIFEST_FILE)
+
+    index = AnnotationIndex(args.directory, args.categories)
+    if index.created:
+        index.reconcile()
+    start = time.perf_counter()
+    keep, clusters = find_duplicates(index, args.max_distance, args.label_tolerance, args.workers)
+    elapsed = time.perf_counter() - start
+    write_manifest(index, keep, output, max_distance=args.max_distance, label_tolerance=args.label_tolerance)
+
+    sizes = np.array([os.path.getsize(index.image_path(i)) for i in range(len(index))], dtype=np.int64)
+    total, kept = len(index), int(keep.sum())
+    duplicate_clusters = len(np.unique(clusters[~keep])) if total > kept else 0
+    print('%d images, %d kept, %d removed in %d clusters (%.1f s)' % (
+        total, kept, total - kept, duplicate_clusters, elapsed))
+    print('size   %.1f MB -> %.1f MB (-%.0f%%)' % (sizes.sum() / 1e6, sizes[keep].sum() / 1e6,
+                                                  100.0 * (1 - sizes[keep].sum() / max(1, sizes.sum()))))
+    print('epoch  %d -> %d samples (-%.0f%%)' % (total, kept, 100.0 * (1 - kept / max(1, total))))
+    print('wrote %s' % output)
+    if args.measure:
+        import torchvision.transforms as transforms
+        from .xy_dataset import XYDataset
+        transform = transforms.Compose([transforms.Resize((224, 224)), transforms.ToTensor()])
+        full = _epoch_seconds(XYDataset(args.directory, args.categories, transform), 64, args.workers)
+        deduped = _epoch_seconds(XYDataset(args.directory, args.categories, transform, manifest=output),
+                                 64, args.workers)
+        print('epoch time %.1f s -> %.1f s (-%.0f%%)' % (full, deduped, 100.0 * (1 - deduped / full)))
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
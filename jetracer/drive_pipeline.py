@@ -0,0 +1,481 @@
+import collections
+import sys
+import threading
+import time
+
+import numpy as np
+
+from .tracing import tracer
+
+
+class Packet(object):
+    """A frame (or something derived from it) moving through the pipeline."""
+
+    __slots__ = ('seq', 'timestamp', 'data')
+
+    def __init__(self, seq, timestamp, data):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.data = data
+
+
+class LatestSlot(object):
+    """Bounded hand-off between two stages that only ever holds the newest item.
+
+    ``put`` overwrites whatever the consumer has not picked up yet, so a slow
+    consumer skips straight to the newest frame instead of building a queue;
+    the overwritten item is passed to ``on_drop``, if given.
+    """
+
+    def __init__(self, on_drop=None):
+        self.on_drop = on_drop
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = -1
+        self._taken = True
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item, seq):
+        with self._cond:
+            dropped = None
+            if not self._taken:
+                self.dropped += 1
+                dropped = self._item
+            self._item = item
+            self._seq = seq
+            self._taken = False
+            self._cond.notify_all()
+        if dropped is not None and self.on_drop is not None:
+            self.on_drop(dropped)
+
+    def get_newer_than(self, seq, timeout=None):
+        """Block until an item newer than ``seq`` is available, or return None on timeout/close."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._seq > seq, timeout)
+            if self._seq <= seq:
+                return None
+            self._taken = True
+            return self._item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+            self._item = None
+            self._seq = -1
+            self._taken = True
+            self.dropped = 0
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class StageStats(object):
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.busy = 0.0
+        self.started = None
+        self.latencies = collections.deque(maxlen=window)
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.busy = 0.0
+            self.started = time.monotonic()
+            self.latencies.clear()
+
+    def record(self, duration):
+        with self._lock:
+            self.count += 1
+            self.busy += duration
+            self.latencies.append(duration)
+
+    def summary(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9) if self.started else 0.0
+            latencies = sorted(self.latencies)
+            return {
+                'count': self.count,
+                'fps': self.count / elapsed if elapsed else 0.0,
+                'utilization': self.busy / elapsed if elapsed else 0.0,
+                'latency_p50': _percentile(latencies, 50),
+                'latency_p95': _percentile(latencies, 95),
+                'latency_p99': _percentile(latencies, 99),
+            }
+
+
+class Stage(object):
+    """Worker thread that takes the newest packet from ``source``, applies ``fn`` and publishes to ``sink``."""
+
+    def __init__(self, name, fn, source, sink=None, setup=None, on_error=None):
+        self.name = name
+        self.fn = fn
+        self.source = source
+        self.sink = sink
+        self.setup = setup
+        self.on_error = on_error
+        self.error = None
+        self.stats = StageStats()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self.error = None
+        self.stats.reset()
+        self._thread = threading.Thread(target=self._run, name='jetracer-' + self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        try:
+            if self.setup is not None:
+                self.setup()
+            seq = -1
+            while not self._stop.is_set():
+                packet = self.source.get_newer_than(seq, timeout=0.1)
+                if packet is None:
+                    continue
+                seq = packet.seq
+                start = time.perf_counter()
+                result = self.fn(packet)
+                self.stats.record(time.perf_counter() - start)
+                if self.sink is not None and result is not None:
+                    self.sink.put(Packet(packet.seq, packet.timestamp, result), packet.seq)
+        except Exception as e:
+            # the thread ends here; on_error lets the owner bring the rest down safely
+            self.error = e
+            print(f"{self.name} stage failed: {e!r}")
+            if self.on_error is not None:
+                self.on_error(self, e)
+
+
+class CaptureSource(object):
+    """Adapts a camera to the ``get_newer_than`` interface of a slot.
+
+    Cameras with ``read_newer_than`` (``JetRacerCamera``) keep their own
+    sequence numbers and capture timestamps; for anything else ``read()`` is
+    expected to block until a new frame arrives and is stamped on return.
+    """
+
+    def __init__(self, camera):
+        self.camera = camera
+        self._seq = -1
+
+    def get_newer_than(self, seq, timeout=None):
+        if hasattr(self.camera, 'read_newer_than'):
+            entry = self.camera.read_newer_than(self._seq, timeout)
+            if entry is None:
+                return None
+            frame, self._seq, timestamp = entry
+            return Packet(self._seq, timestamp, frame)
+        frame = self.camera.read()
+        if frame is None:
+            return None
+        self._seq += 1
+        return Packet(self._seq, time.monotonic(), frame)
+
+
+def _disable_grad():
+    # grad mode is thread local, so it has to be switched off inside the worker
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_grad_enabled(False)
+
+
+class BufferPool(object):
+    """Reusable private copies of tensors or arrays.
+
+    ``copy`` leases a free buffer of the same shape, dtype and device (and
+    only allocates when there is none), copies into it and returns it;
+    ``release`` gives it back.  Anything that is neither a tensor nor an
+    array is returned as is.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = []
+        self._leased = set()
+        self.allocated = 0
+
+    @staticmethod
+    def _matches(buffer, value):
+        if buffer.shape != value.shape or buffer.dtype != value.dtype:
+            return False
+        return getattr(buffer, 'device', None) == getattr(value, 'device', None)
+
+    def copy(self, value):
+        torch = sys.modules.get('torch')
+        is_tensor = torch is not None and isinstance(value, torch.Tensor)
+        if not is_tensor and not isinstance(value, np.ndarray):
+            return value
+        with self._lock:
+            buffer = next((b for b in self._free if self._matches(b, value)), None)
+            if buffer is not None:
+                self._free.remove(buffer)
+        if buffer is None:
+            buffer = torch.empty_like(value) if is_tensor else np.empty_like(value)
+            self.allocated += 1
+        if is_tensor:
+            buffer.copy_(value)
+        else:
+            np.copyto(buffer, value)
+        with self._lock:
+            self._leased.add(id(buffer))
+        return buffer
+
+    def release(self, buffer):
+        with self._lock:
+            if id(buffer) in self._leased:
+                self._leased.discard(id(buffer))
+                self._free.append(buffer)
+
+
+def steering_from_output(output):
+    return float(output.reshape(-1)[0])
+
+
+class DrivePipeline(object):
+    """Runs capture, preprocessing, inference and actuation as concurrent stages.
+
+    Stages are joined by ``LatestSlot``s, so each one always works on the newest
+    frame available and a slow stage drops stale frames rather than queueing
+    them.  ``preprocess`` may reuse its output buffer (``Preprocessor`` does)
+    no matter how long the model takes: its result is copied into a
+    ``BufferPool`` buffer that inference (or the slot, when it drops the
+    input) hands back when done.  That costs one copy of the model input
+    per frame (a few percent of the preprocessing itself at 224x224) but no
+    allocations: at most three buffers are ever in use (being filled,
+    waiting, being read).  A rotation inside the preprocessor can't give
+    that guarantee, because a fast preprocessor laps a slow model however
+    many buffers it rotates through.
+
+    If any stage raises, the car is stopped (throttle and steering zeroed),
+    the other stages are shut down, ``running`` turns False and the error is
+    reported in ``error`` and ``stats()``; call ``stop()`` before restarting.
+    """
+
+    def __init__(self, camera, preprocess, model, car, steering_gain=0.75, steering_bias=0.0,
+                 min_steering=-1.0, max_steering=1.0, postprocess=steering_from_output):
+        self.camera = camera
+        self.preprocess = preprocess
+        self.model = model
+        self.car = car
+        self.steering_gain = steering_gain
+        self.steering_bias = steering_bias
+        self.min_steering = min_steering
+        self.max_steering = max_steering
+        self.postprocess = postprocess
+        self.frame_ages = collections.deque(maxlen=1000)
+        self.last_output = None
+        self.error = None
+        self._callbacks = []
+        self._error_lock = threading.Lock()
+
+        self._inputs = BufferPool()
+        self._frames = LatestSlot()
+        self._tensors = LatestSlot(on_drop=lambda packet: self._inputs.release(packet.data))
+        self._outputs = LatestSlot()
+        self.stages = [
+            Stage('capture', lambda packet: packet.data, CaptureSource(camera), self._frames,
+                  on_error=self._on_error),
+            Stage('preprocess', self._preprocess, self._frames, self._tensors, on_error=self._on_error),
+            Stage('inference', self._infer, self._tensors, self._outputs, setup=_disable_grad,
+                  on_error=self._on_error),
+            Stage('actuation', self._actuate, self._outputs, on_error=self._on_error),
+        ]
+        self._running = False
+
+    def _preprocess(self, packet):
+        return self._inputs.copy(self.preprocess(packet.data))
+
+    def _infer(self, packet):
+        try:
+            with tracer.span('inference'):
+                return self.model(packet.data)
+        finally:
+            self._inputs.release(packet.data)
+
+    def _actuate(self, packet):
+        if self.error is not None:
+            return
+        x = self.postprocess(packet.data)
+        steering = x * self.steering_gain + self.steering_bias
+        self.car.steering = max(self.min_steering, min(self.max_steering, steering))
+        if self.error is not None:
+            # another stage failed while this command was being written
+            self._stop_car()
+            return
+        self.last_output = x
+        self.frame_ages.append(time.monotonic() - packet.timestamp)
+        for callback in list(self._callbacks):
+            callback(packet, steering)
+
+    def _stop_car(self):
+        for name in ('throttle', 'steering'):
+            try:
+                setattr(self.car, name, 0.0)
+            except Exception as e:
+                print(f"failed to zero {name}: {e}")
+
+    def _on_error(self, stage, error):
+        with self._error_lock:
+            if self.error is not None:
+                return
+            self.error = (stage.name, error)
+        self._stop_car()
+        for other in self.stages:
+            other.stop()
+        for slot in (self._frames, self._tensors, self._outputs):
+            slot.close()
+
+    def observe(self, callback):
+        """Call ``callback(packet, steering)`` from the actuation stage after every steering update.
+
+        ``packet.data`` is the raw model output for frame ``packet.seq``.
+        """
+        self._callbacks.append(callback)
+
+    def unobserve(self, callback):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def start(self):
+        if self._running:
+            return
+        for slot in (self._frames, self._tensors, self._outputs):
+            slot.reopen()
+        self.frame_ages.clear()
+        self.error = None
+        for stage in reversed(self.stages):
+            stage.start()
+        self._running = True
+
+    def stop(self):
+        if not self._running:
+            return
+        for stage in self.stages:
+            stage.stop()
+        for slot in (self._frames, self._tensors, self._outputs):
+            slot.close()
+        for stage in self.stages:
+            stage.join()
+        self._stop_car()
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running and self.error is None
+
+    def stats(self):
+        ages = sorted(self.frame_ages)
+        return {
+            'stages': {stage.name: stage.stats.summary() for stage in self.stages},
+            'dropped': {
+                'preprocess': self._frames.dropped,
+                'inference': self._tensors.dropped,
+                'actuation': self._outputs.dropped,
+            },
+            'frame_age_p50': _percentile(ages, 50),
+            'frame_age_p95': _percentile(ages, 95),
+            'frame_age_max': ages[-1] if ages else None,
+            'error': None if self.error is None else '%s: %r' % self.error,
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def format_stats(stats):
+    lines = []
+    for name, s in stats['stages'].items():
+        p50 = s['latency_p50'] or 0.0
+        lines.append('%-10s %7.1f fps  %5.1f%% busy  p50 %6.2f ms' % (name, s['fps'], 100 * s['utilization'], 1000 * p50))
+    if stats.get('error'):
+        lines.append('error      ' + stats['error'])
+    lines.append('dropped    ' + '  '.join('%s=%d' % item for item in stats['dropped'].items()))
+    if stats['frame_age_p50'] is not None:
+        lines.append('frame age  p50 %.1f ms  p95 %.1f ms  max %.1f ms' % (
+            1000 * stats['frame_age_p50'], 1000 * stats['frame_age_p95'], 1000 * stats['frame_age_max']))
+    return '\n'.join(lines)
+
+
+def main():
+    import argparse
+    from .camera_backends import SyntheticBackend
+    from .camera_utils import JetRacerCamera
+    from .simulation import MockRacecar
+
+    parser = argparse.ArgumentParser(description='Load-test the drive pipeline with a synthetic camera and mock actuator.')
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--preprocess-ms', type=float, default=5.0)
+    parser.add_argument('--inference-ms', type=float, default=40.0)
+    parser.add_argument('--actuator-ms', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--trace', help='write a Chrome trace of the run to this file')
+    parser.add_argument('--preview-port', type=int, help='serve an MJPEG preview on this localhost port')
+    args = parser.parse_args()
+    if args.trace:
+        tracer.enable()
+
+    def preprocess(frame):
+        time.sleep(args.preprocess_ms / 1000.0)
+        return frame
+
+    def model(frame):
+        time.sleep(args.inference_ms / 1000.0)
+        return np.array([frame[:, :, 0].argmax(axis=1).mean() / frame.shape[1] * 2 - 1, 0.0])
+
+    camera = JetRacerCamera('inference', backend=SyntheticBackend(fps=args.fps))
+    car = MockRacecar(write_latency=args.actuator_ms / 1000.0)
+    camera.start()
+    preview = server = None
+    if args.preview_port:
+        from .preview import MJPEGServer, PreviewEncoder
+        server = MJPEGServer(port=args.preview_port)
+        preview = PreviewEncoder(camera, [server]).start()
+        print('preview at http://127.0.0.1:%d/' % server.port)
+    try:
+        with DrivePipeline(camera, preprocess, model, car) as pipeline:
+            if preview is not None:
+                pipeline.observe(preview)
+            time.sleep(args.duration)
+            stats = pipeline.stats()
+    finally:
+        if preview is not None:
+            preview.stop()
+            server.close()
+        camera.stop()
+    print(format_stats(stats))
+    if preview is not None:
+        p = preview.stats()
+        print('preview    %d frames  now %.1f fps q%d  %d deadline misses  %d backoffs' % (
+            p['frames'], p['fps'], p['quality'], p['deadline_misses'], p['backoffs']))
+    if args.trace:
+        print('wrote %d trace events to %s' % (tracer.export_chrome_trace(args.trace), args.trace))
+
+
+if __name__ == '__main__':
+    main()
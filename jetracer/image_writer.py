@@ -0,0 +1,227 @@
+"""Background JPEG encoding and writing for data collection.
+
+``AsyncImageWriter.submit`` copies the frame into a bounded queue and
+returns immediately; a pool of worker threads encodes (``cv2.imencode``
+releases the GIL, so workers run in parallel) and writes the files.  When
+the queue is full ``policy`` decides what happens:
+
+* ``'block'``: ``submit`` waits for room, so no sample is ever lost,
+* ``'drop_oldest'``: the oldest queued sample is discarded,
+* ``'drop_newest'``: the new sample is discarded and ``submit`` returns False.
+
+Each worker takes up to ``batch_size`` queued samples at a time, creates
+any directories it hasn't seen before, writes the batch and, with
+``fsync=True``, syncs the files and their directories once per batch.
+Only then is each sample's ``callback(path)`` called, so an annotation
+added from the callback never points at a file that isn't on disk.  A
+sample whose encode, write or sync fails is counted in ``errors`` and its
+callback is not called.
+``flush`` waits until everything submitted so far is written; ``close``
+flushes and stops the workers.
+"""
+import collections
+import os
+import threading
+import time
+
+import cv2
+
+from .tracing import tracer
+
+
+POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+class AsyncImageWriter(object):
+
+    def __init__(self, max_queue=64, workers=2, policy='block', batch_size=8, fsync=True, jpeg_quality=95,
+                 rate_window=5.0):
+        if policy not in POLICIES:
+            raise ValueError('policy must be one of %s' % (POLICIES,))
+        self.max_queue = max_queue
+        self.policy = policy
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.rate_window = rate_window
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.max_depth = 0
+        self._queue = collections.deque()
+        self._in_flight = 0
+        self._completed = collections.deque()
+        self._known_dirs = set()
+        self._dirs_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._run, name='jetracer-image-writer-%d' % i, daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, path, image, callback=None):
+        """Queue ``image`` (copied) to be written to ``path``; False if it was dropped."""
+        item = (path, image.copy(), callback)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('writer is closed')
+            self.submitted += 1
+            if len(self._queue) >= self.max_queue:
+                if self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return False
+                if self.policy == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    self._cond.wait_for(lambda: len(self._queue) < self.max_queue or self._closed)
+                    if self._closed:
+                        raise RuntimeError('writer is closed')
+            self._queue.append(item)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify_all()
+        return True
+
+    def _take(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._closed)
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            self._in_flight += len(batch)
+            self._cond.notify_all()
+            return batch
+
+    def _ensure_dir(self, directory):
+        if directory in self._known_dirs:
+            return
+        with self._dirs_lock:
+            if directory not in self._known_dirs:
+                os.makedirs(directory, exist_ok=True)
+                self._known_dirs.add(directory)
+
+    def _write_batch(self, batch):
+        opened = []
+        for path, image, callback in batch:
+            try:
+                with tracer.span('writer.encode'):
+                    ok, data = cv2.imencode(os.path.splitext(path)[1] or '.jpg', image, self.params)
+                if not ok:
+                    raise IOError('could not encode %s' % path)
+                self._ensure_dir(os.path.dirname(path))
+                with tracer.span('writer.write'):
+                    f = open(path, 'wb')
+                    try:
+                        f.write(data)
+                    except Exception:
+                        f.close()
+                        raise
+                opened.append((path, callback, f, len(data)))
+            except Exception as e:
+                print(f"failed to write {path}: {e}")
+        written = []
+        with tracer.span('writer.fsync'):
+            # every file is closed here, whether or not syncing it worked
+            for path, callback, f, size in opened:
+                try:
+                    try:
+                        if self.fsync:
+                            f.flush()
+                            os.fsync(f.fileno())
+                    finally:
+                        f.close()
+                    written.append((path, callback, size))
+                except Exception as e:
+                    print(f"failed to sync {path}: {e}")
+            if self.fsync:
+                failed = set()
+                for directory in {os.path.dirname(path) for path, _, _ in written}:
+                    try:
+                        fd = os.open(directory or '.', os.O_RDONLY)
+                        try:
+                            os.fsync(fd)
+                        finally:
+                            os.close(fd)
+                    except OSError as e:
+                        print(f"failed to sync {directory}: {e}")
+                        failed.add(directory)
+                written = [entry for entry in written if os.path.dirname(entry[0]) not in failed]
+        for path, callback, _ in written:
+            if callback is not None:
+                try:
+                    callback(path)
+                except Exception as e:
+                    print(f"image writer callback failed: {e}")
+        return written
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                break
+            written = []
+            try:
+                written = self._write_batch(batch)
+            except Exception as e:
+                # count the batch as failed but keep the worker alive, or flush() never returns
+                print(f"image writer failed: {e}")
+            finally:
+                now = time.monotonic()
+                with self._cond:
+                    self._in_flight -= len(batch)
+                    self.written += len(written)
+                    self.errors += len(batch) - len(written)
+                    self.bytes_written += sum(size for _, _, size in written)
+                    self._completed.extend([now] * len(written))
+                    self._prune(now)
+                    self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until every sample submitted so far has been written; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._in_flight, timeout)
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def _prune(self, now):
+        cutoff = now - self.rate_window
+        while self._completed and self._completed[0] < cutoff:
+            self._completed.popleft()
+
+    def samples_per_second(self):
+        """Sustained write rate over the last ``rate_window`` seconds."""
+        with self._cond:
+            self._prune(time.monotonic())
+            return len(self._completed) / self.rate_window
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_depth,
+            'samples_per_second': self.samples_per_second(),
+            'mb_written': self.bytes_written / 1e6,
+        }
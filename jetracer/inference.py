@@ -0,0 +1,233 @@
+import hashlib
+import os
+import platform
+
+import numpy as np
+import torch
+import torchvision
+
+from . import artifact_cache
+
+
+INPUT_SHAPE = (1, 3, 224, 224)
+
+
+def build_model(num_outputs=2):
+    """The road following network: ``resnet18`` with a ``Linear(512, num_outputs)`` head."""
+    model = torchvision.models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(512, num_outputs)
+    return model
+
+
+def load_model(checkpoint, num_outputs=2):
+    model = build_model(num_outputs)
+    model.load_state_dict(torch.load(checkpoint, map_location='cpu', weights_only=True))
+    return model.eval()
+
+
+class InferenceEngine(object):
+    """Common interface of the inference backends.
+
+    ``predict`` takes an Nx3xHxW batch (tensor or array) of preprocessed
+    frames and returns the model outputs as an NxK float32 numpy array.
+    Engines are callable, so they can be used as a ``DrivePipeline`` model.
+    """
+
+    name = None
+
+    def predict(self, batch):
+        raise NotImplementedError
+
+    def __call__(self, batch):
+        return self.predict(batch)
+
+
+class EagerEngine(InferenceEngine):
+    """Plain eager-mode PyTorch."""
+
+    name = 'eager'
+
+    def __init__(self, model, device='cpu', dtype=torch.float32):
+        self.device = torch.device(device)
+        self.dtype = dtype
+        self.model = model.eval().to(self.device, dtype)
+
+    def predict(self, batch):
+        batch = torch.as_tensor(batch).to(self.device, self.dtype)
+        with torch.inference_mode():
+            return self.model(batch).float().cpu().numpy()
+
+
+class TorchScriptEngine(InferenceEngine):
+    """A frozen TorchScript module (also used for the quantized artifacts)."""
+
+    name = 'torchscript'
+
+    def __init__(self, module, num_threads=None):
+        if isinstance(module, str):
+            module = torch.jit.load(module, map_location='cpu')
+        self.module = module.eval()
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+    def predict(self, batch):
+        batch = torch.as_tensor(batch, dtype=torch.float32)
+        with torch.inference_mode():
+            return self.module(batch).cpu().numpy()
+
+
+class OnnxRuntimeEngine(InferenceEngine):
+    """An exported ONNX model run with ONNX Runtime."""
+
+    name = 'onnxruntime'
+
+    def __init__(self, path, providers=None, num_threads=None):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=providers or onnxruntime.get_available_providers())
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        if isinstance(batch, torch.Tensor):
+            batch = batch.detach().cpu().float().numpy()
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+def _example_input():
+    return torch.zeros(INPUT_SHAPE)
+
+
+def export_torchscript(model, path):
+    """Trace, freeze and save ``model``."""
+    with torch.no_grad():
+        module = torch.jit.freeze(torch.jit.trace(model.eval(), _example_input()))
+    torch.jit.save(module, path)
+    return path
+
+
+def export_onnx(model, path, opset=17):
+    torch.onnx.export(model.eval(), (_example_input(),), path, input_names=['input'], output_names=['output'],
+                      dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}}, opset_version=opset,
+                      dynamo=False)
+    return path
+
+
+def quantized_backend():
+    return 'qnnpack' if platform.machine() in ('aarch64', 'arm64') else 'x86'
+
+
+def quantize_dynamic(model):
+    """int8 weights for the ``Linear`` head; activations stay fp32."""
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model, calibration_batches, backend=None):
+    """Post-training static int8 quantization of the whole network, calibrated on real frames."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+    backend = backend or quantized_backend()
+    torch.backends.quantized.engine = backend
+    prepared = prepare_fx(model.eval(), get_default_qconfig_mapping(backend), (_example_input(),))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(torch.as_tensor(batch, dtype=torch.float32))
+    return convert_fx(prepared)
+
+
+ARTIFACTS = {
+    'torchscript': 'model.ts',
+    'onnx': 'model.onnx',
+    'dynamic_int8': 'model_dynamic_int8.ts',
+    'static_int8': 'model_static_int8.ts',
+}
+
+
+def export_artifact(checkpoint, name, path, calibration_batches=None, num_outputs=2):
+    """Convert a ``resnet18`` road following checkpoint to one of the ``ARTIFACTS`` formats at ``path``."""
+    model = load_model(checkpoint, num_outputs)
+    if name == 'torchscript':
+        export_torchscript(model, path)
+    elif name == 'onnx':
+        export_onnx(model, path)
+    elif name == 'dynamic_int8':
+        export_torchscript(quantize_dynamic(model), path)
+    elif name == 'static_int8':
+        if calibration_batches is None:
+            raise ValueError('static_int8 needs calibration_batches')
+        export_torchscript(quantize_static(model, calibration_batches), path)
+    else:
+        raise ValueError('unknown artifact format %r' % name)
+    return path
+
+
+def export_artifacts(checkpoint, directory, formats=tuple(ARTIFACTS), calibration_batches=None, num_outputs=2):
+    """Produce every requested artifact from a ``resnet18`` road following checkpoint.
+
+    ``static_int8`` needs ``calibration_batches`` (an iterable of
+    preprocessed Nx3x224x224 batches, ideally from recorded frames).
+    Returns a dict of format name to path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name in formats:
+        paths[name] = export_artifact(checkpoint, name, os.path.join(directory, ARTIFACTS[name]),
+                                      calibration_batches, num_outputs)
+    return paths
+
+
+def cached_artifact_path(checkpoint, name, calibration_batches=None, num_outputs=2, directory=None):
+    """Path of ``checkpoint`` converted to ``name``, converting only if it isn't in the artifact cache yet."""
+    params = {'num_outputs': num_outputs, 'torch': torch.__version__, 'torchvision': torchvision.__version__}
+    if name in ('dynamic_int8', 'static_int8'):
+        params['backend'] = quantized_backend()
+    if name == 'static_int8' and calibration_batches is not None:
+        calibration_batches = [torch.as_tensor(batch, dtype=torch.float32) for batch in calibration_batches]
+        sha = hashlib.sha256()
+        for batch in calibration_batches:
+            sha.update(batch.contiguous().numpy().tobytes())
+        params['calibration'] = sha.hexdigest()
+    return artifact_cache.cached_artifact(
+        checkpoint, name, lambda path: export_artifact(checkpoint, name, path, calibration_batches, num_outputs),
+        params, suffix=os.path.splitext(ARTIFACTS[name])[1], directory=directory)
+
+
+def cached_engine(checkpoint, name='torchscript', calibration_batches=None, num_outputs=2, directory=None, **kwargs):
+    """``load_engine`` on the cached ``name`` conversion of ``checkpoint``."""
+    return load_engine(cached_artifact_path(checkpoint, name, calibration_batches, num_outputs, directory), **kwargs)
+
+
+def cached_trt_module(checkpoint, num_outputs=2, fp16=True, directory=None):
+    """A ``torch2trt.TRTModule`` for ``checkpoint``; the TensorRT conversion only runs on a cache miss."""
+    import tensorrt
+    from torch2trt import TRTModule, torch2trt
+
+    def build(path):
+        model = load_model(checkpoint, num_outputs).cuda()
+        data = torch.zeros(INPUT_SHAPE).cuda()
+        if fp16:
+            model, data = model.half(), data.half()
+        torch.save(torch2trt(model, [data], fp16_mode=fp16).state_dict(), path)
+
+    # TensorRT engines are specific to the GPU and TensorRT version they were built with
+    params = {'num_outputs': num_outputs, 'fp16': fp16, 'torch': torch.__version__,
+              'tensorrt': tensorrt.__version__, 'device': torch.cuda.get_device_name()}
+    path = artifact_cache.cached_artifact(checkpoint, 'trt', build, params, suffix='.pth', directory=directory)
+    module = TRTModule()
+    module.load_state_dict(torch.load(path))
+    return module
+
+
+def load_engine(path, num_outputs=2, **kwargs):
+    """Open an engine for a checkpoint (``.pth``), TorchScript (``.ts``) or ONNX (``.onnx``) file."""
+    if path.endswith('.onnx'):
+        return OnnxRuntimeEngine(path, **kwargs)
+    if path.endswith('.ts'):
+        if 'int8' in os.path.basename(path):
+            torch.backends.quantized.engine = quantized_backend()
+        return TorchScriptEngine(path, **kwargs)
+    return EagerEngine(load_model(path, num_outputs), **kwargs)
@@ -1,6 +1,8 @@
 from .racecar import Racecar
 import traitlets
-from adafruit_servokit import ServoKit
+from .actuator import ActuatorWriter
+from .pca9685 import PCA9685
+from .tracing import tracer
 
 
 class NvidiaRacecar(Racecar):
@@ -13,6 +15,7 @@ class NvidiaRacecar(Racecar):
     throttle_channel = traitlets.Integer(default_value=1)
     
     def __init__(self, *args, **kwargs):
+        from adafruit_servokit import ServoKit
         super(NvidiaRacecar, self).__init__(*args, **kwargs)
         self.kit = ServoKit(channels=16, address=self.i2c_address)
         self.steering_motor = self.kit.continuous_servo[self.steering_channel]
@@ -20,8 +23,74 @@ class NvidiaRacecar(Racecar):
     
     @traitlets.observe('steering')
     def _on_steering(self, change):
-        self.steering_motor.throttle = change['new'] * self.steering_gain + self.steering_offset
+        with tracer.span('racecar.steering'):
+            self.steering_motor.throttle = change['new'] * self.steering_gain + self.steering_offset
     
     @traitlets.observe('throttle')
     def _on_throttle(self, change):
-        self.throttle_motor.throttle = change['new'] * self.throttle_gain
\ No newline at end of file
+        with tracer.span('racecar.throttle'):
+            self.throttle_motor.throttle = change['new'] * self.throttle_gain
+
+
+class AsyncNvidiaRacecar(Racecar):
+    """``NvidiaRacecar`` whose servo writes happen off the caller's thread.
+
+    Setting ``steering``/``throttle`` only hands the new pulse width to an
+    ``ActuatorWriter``; its thread coalesces updates (latest value wins) and
+    writes both channels to the PCA9685 at most ``max_update_rate`` times a
+    second, in a single block write when both changed.  Pass ``bus`` (for
+    example a ``pca9685.SimulatedPCA9685Bus``) to run without hardware.
+
+    A command maps to ``center_pulse + value * steering_range`` (or
+    ``throttle_range``) microseconds, clamped to ``min_pulse``..``max_pulse``;
+    a negative range reverses the channel.  The defaults match ServoKit's
+    continuous servo (750-2250 us).
+    """
+    
+    i2c_bus = traitlets.Integer(default_value=7)
+    i2c_address = traitlets.Integer(default_value=0x40)
+    steering_gain = traitlets.Float(default_value=-0.65)
+    steering_offset = traitlets.Float(default_value=0)
+    steering_channel = traitlets.Integer(default_value=0)
+    throttle_gain = traitlets.Float(default_value=0.8)
+    throttle_channel = traitlets.Integer(default_value=1)
+    center_pulse = traitlets.Float(default_value=1500)
+    steering_range = traitlets.Float(default_value=750)
+    throttle_range = traitlets.Float(default_value=750)
+    min_pulse = traitlets.Float(default_value=750)
+    max_pulse = traitlets.Float(default_value=2250)
+    max_update_rate = traitlets.Float(default_value=100.0)
+    
+    def __init__(self, *args, bus=None, **kwargs):
+        super(AsyncNvidiaRacecar, self).__init__(*args, **kwargs)
+        if bus is None:
+            import smbus
+            bus = smbus.SMBus(self.i2c_bus)
+        self.bus = bus
+        self.pca = PCA9685(bus, address=self.i2c_address)
+        self.pca.initialize()
+        center = self._pulse(0.0, 0.0)
+        self.pca.set_pulses({self.steering_channel: center, self.throttle_channel: center})
+        self.writer = ActuatorWriter(self.pca.set_pulses, max_rate=self.max_update_rate)
+    
+    def _pulse(self, value, pulse_range):
+        return max(self.min_pulse, min(self.max_pulse, self.center_pulse + value * pulse_range))
+    
+    @traitlets.observe('steering')
+    def _on_steering(self, change):
+        with tracer.span('racecar.steering'):
+            pulse = self._pulse(change['new'] * self.steering_gain + self.steering_offset, self.steering_range)
+            self.writer.set(self.steering_channel, pulse)
+    
+    @traitlets.observe('throttle')
+    def _on_throttle(self, change):
+        with tracer.span('racecar.throttle'):
+            pulse = self._pulse(change['new'] * self.throttle_gain, self.throttle_range)
+            self.writer.set(self.throttle_channel, pulse)
+    
+    def close(self):
+        """Center both channels and stop the writer thread."""
+        center = self._pulse(0.0, 0.0)
+        self.writer.set(self.steering_channel, center)
+        self.writer.set(self.throttle_channel, center)
+        self.writer.close()
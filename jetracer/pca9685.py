@@ -0,0 +1,112 @@
+import collections
+import threading
+import time
+
+
+MODE1 = 0x00
+MODE2 = 0x01
+LED0_ON_L = 0x06
+PRESCALE = 0xFE
+
+MODE1_SLEEP = 0x10
+MODE1_AUTO_INCREMENT = 0x20
+MODE2_TOTEM_POLE = 0x04
+
+OSCILLATOR_HZ = 25000000
+
+
+class PCA9685(object):
+    """Minimal PCA9685 PWM driver on an ``smbus``-compatible bus.
+
+    ``set_pulses`` writes every run of adjacent channels with a single
+    auto-incrementing block write, so updating steering and throttle on
+    channels 0 and 1 together is one I2C transaction.
+    """
+
+    def __init__(self, bus, address=0x40, frequency=50):
+        self.bus = bus
+        self.address = address
+        self.frequency = frequency
+
+    def initialize(self):
+        self.bus.write_byte_data(self.address, MODE1, MODE1_SLEEP)
+        time.sleep(0.005)
+        prescale = int(OSCILLATOR_HZ / (4096 * self.frequency) - 1)
+        self.bus.write_byte_data(self.address, PRESCALE, prescale)
+        self.bus.write_byte_data(self.address, MODE1, MODE1_AUTO_INCREMENT)
+        time.sleep(0.005)
+        self.bus.write_byte_data(self.address, MODE2, MODE2_TOTEM_POLE)
+
+    def pulse_to_ticks(self, pulse_us):
+        return max(0, min(4095, int(pulse_us * 4096 * self.frequency / 1e6)))
+
+    def set_pulses(self, pulses):
+        """Set ``{channel: pulse_us}``, one block write per run of consecutive channels."""
+        channels = sorted(pulses)
+        start = 0
+        while start < len(channels):
+            end = start + 1
+            while end < len(channels) and channels[end] == channels[end - 1] + 1:
+                end += 1
+            data = []
+            for channel in channels[start:end]:
+                ticks = self.pulse_to_ticks(pulses[channel])
+                data += [0, 0, ticks & 0xFF, (ticks >> 8) & 0x0F]
+            self.bus.write_i2c_block_data(self.address, LED0_ON_L + 4 * channels[start], data)
+            start = end
+
+    def set_pulse(self, channel, pulse_us):
+        self.set_pulses({channel: pulse_us})
+
+
+class SimulatedPCA9685Bus(object):
+    """In-memory stand-in for ``smbus.SMBus`` with PCA9685 devices on it.
+
+    Every transaction is timestamped so tests can count bus writes and
+    measure command-to-bus latency without hardware.  ``byte_time`` is the
+    simulated time per transferred byte (about 22 us at 400 kHz).
+    """
+
+    def __init__(self, byte_time=0.0, history=10000):
+        self.byte_time = byte_time
+        self.registers = collections.defaultdict(lambda: bytearray(256))
+        self.transactions = collections.deque(maxlen=history)
+        self.write_count = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+    def _transfer(self, address, register, data):
+        if self.byte_time:
+            # address + register bytes, then the payload
+            time.sleep(self.byte_time * (2 + len(data)))
+        with self._lock:
+            registers = self.registers[address]
+            auto_increment = registers[MODE1] & MODE1_AUTO_INCREMENT
+            if len(data) > 1 and not auto_increment:
+                raise IOError('block write to 0x%02x without auto-increment enabled' % address)
+            registers[register:register + len(data)] = bytes(data)
+            self.write_count += 1
+            self.bytes_written += len(data)
+            self.transactions.append((time.monotonic(), address, register, len(data)))
+
+    def write_byte_data(self, address, register, value):
+        self._transfer(address, register, [value])
+
+    def write_i2c_block_data(self, address, register, data):
+        self._transfer(address, register, list(data))
+
+    def read_byte_data(self, address, register):
+        with self._lock:
+            return self.registers[address][register]
+
+    def channel_ticks(self, address, channel):
+        registers = self.registers[address]
+        base = LED0_ON_L + 4 * channel
+        return registers[base + 2] | (registers[base + 3] << 8)
+
+    def channel_pulse(self, address, channel, frequency=50):
+        """Return the pulse width in microseconds currently programmed on ``channel``."""
+        return self.channel_ticks(address, channel) * 1e6 / (4096 * frequency)
+
+    def close(self):
+        pass
@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+import torch
+
+from .tracing import tracer
+
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+_DTYPES = {
+    'fp32': torch.float32,
+    'float32': torch.float32,
+    'fp16': torch.float16,
+    'float16': torch.float16,
+    'half': torch.float16,
+}
+
+
+def _parse_dtype(dtype):
+    if isinstance(dtype, torch.dtype):
+        return dtype
+    return _DTYPES[dtype]
+
+
+class Preprocessor(object):
+    """Turns BGR uint8 frames into normalized NCHW tensors without per-frame allocations.
+
+    Frames are resized straight into a preallocated (pinned, on CUDA) uint8
+    staging buffer, uploaded as uint8, and then scaled, normalized and
+    transposed in a single pass per channel on the target device.  ``mean``
+    and ``std`` apply to the output channels in order.  With ``swap_rb=False``
+    the frame keeps its BGR channel order, which is what ``XYDataset`` feeds
+    the road following models during training.
+
+    Results are views into ``num_buffers`` rotating output buffers: a result
+    stays valid until ``num_buffers`` further calls have been made.
+    """
+
+    def __init__(self, size=(224, 224), device='cpu', dtype='fp32', mean=IMAGENET_MEAN, std=IMAGENET_STD,
+                 swap_rb=True, max_batch=1, num_buffers=1, interpolation=cv2.INTER_LINEAR):
+        self.width, self.height = size
+        self.device = torch.device(device)
+        self.dtype = _parse_dtype(dtype)
+        self.swap_rb = swap_rb
+        self.max_batch = max_batch
+        self.interpolation = interpolation
+
+        # x_norm = (x / 255 - mean) / std = x * scale + bias
+        mean = torch.tensor(mean, dtype=torch.float32)
+        std = torch.tensor(std, dtype=torch.float32)
+        self._scale = (1.0 / (255.0 * std)).to(self.device)
+        self._bias = (-mean / std).to(self.device)
+        # output channel c is read from this channel of the BGR source
+        self._source_channel = (2, 1, 0) if swap_rb else (0, 1, 2)
+
+        cuda = self.device.type == 'cuda'
+        shape = (max_batch, self.height, self.width, 3)
+        self._host = torch.empty(shape, dtype=torch.uint8, pin_memory=cuda)
+        self._host_np = self._host.numpy()
+        self._source = torch.empty(shape, dtype=torch.uint8, device=self.device) if cuda else self._host
+        self._uploaded = torch.cuda.Event() if cuda else None
+        self._outputs = [torch.empty((max_batch, 3, self.height, self.width), dtype=self.dtype, device=self.device)
+                         for _ in range(num_buffers)]
+        self._next_output = 0
+
+    def _stage(self, index, frame):
+        if frame.shape[0] == self.height and frame.shape[1] == self.width:
+            np.copyto(self._host_np[index], frame)
+        else:
+            cv2.resize(frame, (self.width, self.height), dst=self._host_np[index], interpolation=self.interpolation)
+
+    def _check_count(self, count):
+        if count > self.max_batch:
+            raise ValueError('got %d frames but max_batch is %d' % (count, self.max_batch))
+
+    def _normalize(self, source):
+        output = self._outputs[self._next_output][:source.shape[0]]
+        self._next_output = (self._next_output + 1) % len(self._outputs)
+        for c, k in enumerate(self._source_channel):
+            torch.addcmul(self._bias[c], source[..., k], self._scale[c], out=output[:, c])
+        return output
+
+    def __call__(self, frame):
+        """Preprocess a single HxWx3 BGR frame into a 1x3xHxW tensor."""
+        return self.batch((frame,))
+
+    def batch(self, frames):
+        """Preprocess a sequence (or NxHxWx3 array) of BGR frames into an Nx3xHxW tensor."""
+        count = len(frames)
+        self._check_count(count)
+        with tracer.span('preprocess'):
+            if self._uploaded is not None:
+                # the previous upload may still be reading the staging buffer
+                self._uploaded.synchronize()
+            for i, frame in enumerate(frames):
+                self._stage(i, frame)
+            if self._uploaded is not None:
+                self._source[:count].copy_(self._host[:count], non_blocking=True)
+                self._uploaded.record()
+            return self._normalize(self._source[:count])
+
+    def normalize(self, images):
+        """Normalize an NxHxWx3 uint8 tensor whose frames are already at the target size."""
+        self._check_count(images.shape[0])
+        if tuple(images.shape[1:]) != (self.height, self.width, 3):
+            raise ValueError('expected Nx%dx%dx3 images, got %s' % (self.height, self.width, tuple(images.shape)))
+        return self._normalize(images.to(self.device, non_blocking=True))
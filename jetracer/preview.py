@@ -0,0 +1,279 @@
+"""Live preview of what the drive loop sees, rendered off the control path.
+
+``PreviewEncoder`` is a ``DrivePipeline`` observer.  On the actuation
+thread it only drops the newest model output into a ``LatestSlot``.  Its
+own low-priority thread fetches the matching frame from the camera ring,
+draws the predicted point and JPEG-encodes it for any number of sinks
+(callables taking the JPEG bytes)::
+
+    preview = PreviewEncoder(camera, [WidgetSink(image_widget), MJPEGServer(port=8090)])
+    pipeline.observe(preview)
+    preview.start()
+
+Frame rate and JPEG quality adapt AIMD-style: every time a steering
+command misses its deadline both are cut (rate halved, quality down 10),
+and after each ``recover_interval`` without a miss they creep back up
+(+1 fps, +5 quality).  The deadline comes from the control loop itself:
+the median age of the frames recent commands were computed from, plus
+one camera period (estimated from the frames' sequence numbers and
+timestamps) plus ``slack``.  A frame can wait up to one camera period for
+a busy model through no fault of the preview, so only lateness beyond
+that counts, however slow the model is.
+"""
+import collections
+import os
+import threading
+import time
+
+import cv2
+
+from .drive_pipeline import LatestSlot
+from .recording import _to_numpy
+from .tracing import tracer
+
+
+class PreviewEncoder(object):
+
+    def __init__(self, camera, sinks=(), slack=0.01, max_fps=15.0, min_fps=1.0, quality=80, min_quality=30,
+                 recover_interval=1.0, nice=10, baseline_window=100):
+        self.camera = camera
+        self.sinks = list(sinks)
+        self.slack = slack
+        self.deadline = None
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.max_quality = quality
+        self.min_quality = min_quality
+        self.recover_interval = recover_interval
+        self.nice = nice
+        self.fps = max_fps
+        self.quality = quality
+        self.output = None
+        self.steering = None
+        self.frames_encoded = 0
+        self.deadline_misses = 0
+        self.backoffs = 0
+        self.encode_times = collections.deque(maxlen=100)
+        self.frame_ages = collections.deque(maxlen=baseline_window)
+        self.camera_period = None
+        self._last_frame = None
+        self._seen_misses = 0
+        self._last_change = time.monotonic()
+        self._slot = LatestSlot()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __call__(self, packet, steering):
+        """``DrivePipeline`` observer; never waits on rendering."""
+        age = time.monotonic() - packet.timestamp
+        deadline = self.deadline
+        if deadline is not None and age > deadline:
+            self.deadline_misses += 1
+        self.frame_ages.append(age)
+        last = self._last_frame
+        if last is not None and packet.seq > last[0]:
+            period = (packet.timestamp - last[1]) / (packet.seq - last[0])
+            self.camera_period = period if self.camera_period is None else \
+                self.camera_period + 0.1 * (period - self.camera_period)
+        self._last_frame = (packet.seq, packet.timestamp)
+        self._slot.put((packet, steering), packet.seq)
+
+    def start(self):
+        self._stop.clear()
+        self.frame_ages.clear()
+        self.camera_period = None
+        self.deadline = None
+        self._last_frame = None
+        self._slot.reopen()
+        self._thread = threading.Thread(target=self._run, name='jetracer-preview', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._slot.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _update_deadline(self):
+        # computed here, off the control path; the observer only compares against it
+        ages = sorted(self.frame_ages)
+        if len(ages) >= 10 and self.camera_period is not None:
+            self.deadline = ages[len(ages) // 2] + self.camera_period + self.slack
+
+    def _adapt(self, now):
+        misses = self.deadline_misses
+        if misses != self._seen_misses:
+            self._seen_misses = misses
+            self.fps = max(self.min_fps, self.fps / 2.0)
+            self.quality = max(self.min_quality, self.quality - 10)
+            self.backoffs += 1
+            self._last_change = now
+        elif now - self._last_change >= self.recover_interval:
+            self.fps = min(self.max_fps, self.fps + 1.0)
+            self.quality = min(self.max_quality, self.quality + 5)
+            self._last_change = now
+
+    def _frame(self, seq):
+        if hasattr(self.camera, 'read_seq'):
+            entry = self.camera.read_seq(seq) or self.camera.read_latest()
+            return None if entry is None else entry[0]
+        return self.camera.value
+
+    def render(self, packet, steering):
+        """Draw the predicted point on the frame ``packet`` was computed from and return it as JPEG bytes."""
+        frame = self._frame(packet.seq)
+        if frame is None:
+            return None
+        image = frame.copy()
+        output = _to_numpy(packet.data)
+        x = float(output[0])
+        y = float(output[1]) if len(output) > 1 else 0.0
+        height, width = image.shape[:2]
+        center = (int(width * (x / 2.0 + 0.5)), int(height * (y / 2.0 + 0.5)))
+        cv2.circle(image, center, 8, (255, 0, 0), 3)
+        ok, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        self.output = (x, y)
+        self.steering = steering
+        return jpeg.tobytes() if ok else None
+
+    def _run(self):
+        if self.nice and hasattr(os, 'setpriority'):
+            try:
+                # lower only this thread's priority (Linux schedules threads individually)
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+            except OSError:
+                pass
+        seq = -1
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            delay = next_time - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            item = self._slot.get_newer_than(seq, timeout=0.1)
+            if item is None:
+                continue
+            packet, steering = item
+            seq = packet.seq
+            started = time.monotonic()
+            self._update_deadline()
+            self._adapt(started)
+            with tracer.span('preview.encode'):
+                jpeg = self.render(packet, steering)
+            self.encode_times.append(time.monotonic() - started)
+            if jpeg is not None:
+                self.frames_encoded += 1
+                for sink in list(self.sinks):
+                    try:
+                        sink(jpeg)
+                    except Exception as e:
+                        print(f"preview sink failed: {e}")
+            next_time = started + 1.0 / self.fps
+
+    def stats(self):
+        times = sorted(self.encode_times)
+        return {
+            'frames': self.frames_encoded,
+            'fps': self.fps,
+            'quality': self.quality,
+            'deadline': self.deadline,
+            'deadline_misses': self.deadline_misses,
+            'backoffs': self.backoffs,
+            'encode_p50': times[len(times) // 2] if times else None,
+        }
+
+
+class WidgetSink(object):
+    """Shows previews in an ``ipywidgets.Image(format='jpeg')``."""
+
+    def __init__(self, widget):
+        self.widget = widget
+
+    def __call__(self, jpeg):
+        self.widget.value = jpeg
+
+
+class MJPEGServer(object):
+    """Serves previews as an MJPEG stream at ``http://host:port/`` (and the newest one at ``/frame.jpg``).
+
+    Binds to localhost by default; open it in a browser or with
+    ``cv2.VideoCapture('http://127.0.0.1:8090/')``.
+    """
+
+    BOUNDARY = 'jetracerframe'
+
+    def __init__(self, port=8090, host='127.0.0.1'):
+        import http.server
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._closed = False
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == '/frame.jpg':
+                    server._send_frame(self)
+                elif self.path in ('/', '/stream'):
+                    server._send_stream(self)
+                else:
+                    self.send_error(404)
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='jetracer-mjpeg', daemon=True)
+        self._thread.start()
+
+    def __call__(self, jpeg):
+        with self._cond:
+            self._jpeg = jpeg
+            self._seq += 1
+            self._cond.notify_all()
+
+    def _send_frame(self, handler):
+        with self._cond:
+            jpeg = self._jpeg
+        if jpeg is None:
+            handler.send_error(503, 'no frame yet')
+            return
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'image/jpeg')
+        handler.send_header('Content-Length', str(len(jpeg)))
+        handler.end_headers()
+        handler.wfile.write(jpeg)
+
+    def _send_stream(self, handler):
+        handler.send_response(200)
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=' + self.BOUNDARY)
+        handler.end_headers()
+        seq = 0
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._closed or self._seq != seq, timeout=1.0)
+                    if self._closed:
+                        return
+                    if self._seq == seq:
+                        continue
+                    jpeg, seq = self._jpeg, self._seq
+                handler.wfile.write(b'--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+                                    % (self.BOUNDARY.encode(), len(jpeg)))
+                handler.wfile.write(jpeg)
+                handler.wfile.write(b'\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
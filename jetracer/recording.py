@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .camera_backends import CameraBackend
+
+
+FRAME_DTYPE = np.dtype([('seq', '<i8'), ('timestamp', '<f8')])
+EVENT_DTYPE = np.dtype([('timestamp', '<f8'), ('seq', '<i8'), ('kind', '<i4'), ('values', '<f4', (2,))])
+
+EVENT_STEERING = 0
+EVENT_THROTTLE = 1
+EVENT_OUTPUT = 2
+
+_COMMAND_KINDS = {'steering': EVENT_STEERING, 'throttle': EVENT_THROTTLE}
+
+META_FILE = 'meta.json'
+FRAMES_FILE = 'frames.bin'
+FRAME_INDEX_FILE = 'frames.idx'
+EVENTS_FILE = 'events.bin'
+
+
+def _to_numpy(output):
+    if hasattr(output, 'detach'):
+        output = output.detach().cpu().numpy()
+    return np.asarray(output, dtype=np.float32).reshape(-1)
+
+
+class SessionRecorder(object):
+    """Appends camera frames, model outputs and actuator commands to a session directory.
+
+    Frames are written back to back into ``frames.bin`` (fixed stride, so the
+    file can be memory-mapped as an NxHxWx3 array) with one ``FRAME_DTYPE``
+    record per frame in ``frames.idx``.  Commands and model outputs go to
+    ``events.bin`` as ``EVENT_DTYPE`` records.  All timestamps are on the
+    ``time.monotonic()`` clock used by ``JetRacerCamera``.  Model outputs are
+    taken from ``pipeline`` (a ``DrivePipeline``) or passed to
+    ``record_output``.  Recording into an existing session appends to it.
+    """
+
+    def __init__(self, path, camera=None, car=None, pipeline=None):
+        self.path = path
+        self.camera = camera
+        self.car = car
+        self.pipeline = pipeline
+        self.shape = None
+        self._lock = threading.Lock()
+        self._frames = None
+        self._frame_index = None
+        self._events = None
+        self.frame_count = 0
+        self.event_count = 0
+
+    def start(self):
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.shape = tuple(json.load(f)['shape'])
+        elif self.camera is not None:
+            self._write_meta((self.camera.height, self.camera.width, 3))
+        self._frames = open(os.path.join(self.path, FRAMES_FILE), 'ab')
+        self._frame_index = open(os.path.join(self.path, FRAME_INDEX_FILE), 'ab')
+        self._events = open(os.path.join(self.path, EVENTS_FILE), 'ab')
+        if self.camera is not None:
+            self.camera.observe(self._on_frame, names='value')
+        if self.car is not None:
+            self.car.observe(self._on_command, names=['steering', 'throttle'])
+        if self.pipeline is not None:
+            self.pipeline.observe(self._on_actuate)
+
+    def stop(self):
+        if self.camera is not None:
+            self.camera.unobserve(self._on_frame, names='value')
+        if self.car is not None:
+            self.car.unobserve(self._on_command, names=['steering', 'throttle'])
+        if self.pipeline is not None:
+            self.pipeline.unobserve(self._on_actuate)
+        with self._lock:
+            for f in (self._frames, self._frame_index, self._events):
+                if f is not None:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+            self._frames = self._frame_index = self._events = None
+
+    def _write_meta(self, shape):
+        self.shape = tuple(shape)
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump({'version': 1, 'shape': list(self.shape), 'dtype': 'uint8', 'created': time.time()}, f)
+
+    def _on_frame(self, change):
+        self.record_frame(change['new'], change['seq'], change['timestamp'])
+
+    def _on_actuate(self, packet, steering):
+        self.record_output(packet.seq, packet.data)
+
+    def _on_command(self, change):
+        self._write_event(time.monotonic(), -1, _COMMAND_KINDS[change['name']], (change['new'], 0.0))
+
+    def record_frame(self, frame, seq, timestamp):
+        if self.shape is None:
+            self._write_meta(frame.shape)
+        elif frame.shape != self.shape:
+            raise ValueError('frame shape %s does not match session shape %s' % (frame.shape, self.shape))
+        record = np.array([(seq, timestamp)], dtype=FRAME_DTYPE)
+        with self._lock:
+            if self._frames is None:
+                return
+            self._frames.write(np.ascontiguousarray(frame).data)
+            self._frame_index.write(record.data)
+            self.frame_count += 1
+
+    def record_output(self, seq, output, timestamp=None):
+        """Log the model output for frame ``seq`` (the first two values are kept)."""
+        values = np.zeros(2, dtype=np.float32)
+        output = _to_numpy(output)[:2]
+        values[:len(output)] = output
+        self._write_event(time.monotonic() if timestamp is None else timestamp, seq, EVENT_OUTPUT, values)
+
+    def _write_event(self, timestamp, seq, kind, values):
+        record = np.array([(timestamp, seq, kind, values)], dtype=EVENT_DTYPE)
+        with self._lock:
+            if self._events is None:
+                return
+            self._events.write(record.data)
+            self.event_count += 1
+
+    def flush(self):
+        with self._lock:
+            for f in (self._frames, self._frame_index, self._events):
+                if f is not None:
+                    f.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _memmap_records(path, dtype):
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=dtype)
+    count = os.path.getsize(path) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class SessionLog(object):
+    """Read-only, memory-mapped view of a recorded session.
+
+    A partially written last frame (e.g. after a crash) is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.shape = tuple(self.meta['shape'])
+        index = _memmap_records(os.path.join(path, FRAME_INDEX_FILE), FRAME_DTYPE)
+        frames_path = os.path.join(path, FRAMES_FILE)
+        stride = int(np.prod(self.shape))
+        stored = os.path.getsize(frames_path) // stride if os.path.exists(frames_path) else 0
+        count = min(stored, len(index))
+        self.index = index[:count]
+        if count:
+            self.frames = np.memmap(frames_path, dtype=np.uint8, mode='r', shape=(count,) + self.shape)
+        else:
+            self.frames = np.zeros((0,) + self.shape, dtype=np.uint8)
+        self.events = _memmap_records(os.path.join(path, EVENTS_FILE), EVENT_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        return self.frames[i]
+
+    def __iter__(self):
+        """Yield ``(frame, seq, timestamp)`` for every frame in recording order."""
+        for i in range(len(self)):
+            yield self.frames[i], int(self.index['seq'][i]), float(self.index['timestamp'][i])
+
+    @property
+    def seqs(self):
+        return self.index['seq']
+
+    @property
+    def timestamps(self):
+        return self.index['timestamp']
+
+    @property
+    def duration(self):
+        return float(self.timestamps[-1] - self.timestamps[0]) if len(self) > 1 else 0.0
+
+    def commands(self, name):
+        """Return ``(timestamps, values)`` arrays for the 'steering' or 'throttle' commands."""
+        events = self.events[self.events['kind'] == _COMMAND_KINDS[name]]
+        return events['timestamp'], events['values'][:, 0]
+
+    def outputs(self):
+        """Return ``(seqs, values)`` for the logged model outputs, ``values`` being Nx2."""
+        events = self.events[self.events['kind'] == EVENT_OUTPUT]
+        return events['seq'], events['values']
+
+
+class ReplayBackend(CameraBackend):
+    """Feeds a recorded session back through ``JetRacerCamera``.
+
+    With ``realtime=True`` frames are released with their recorded spacing
+    divided by ``speed``; with ``realtime=False`` they are released as fast as
+    the camera thread can take them.  For a frame-exact offline loop iterate
+    over ``SessionLog`` directly instead.
+    """
+
+    def __init__(self, log, realtime=True, speed=1.0, loop=False):
+        self.log = log if isinstance(log, SessionLog) else SessionLog(log)
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.height, self.width = self.log.shape[:2]
+        self.fps = len(self.log) / self.log.duration if self.log.duration else None
+        self._index = 0
+        self._start = None
+
+    def open(self):
+        self._index = 0
+        self._start = None
+
+    def grab(self):
+        if self._index >= len(self.log):
+            if not self.loop or not len(self.log):
+                return None
+            self._index = 0
+            self._start = None
+        if self.realtime:
+            timestamps = self.log.timestamps
+            offset = (timestamps[self._index] - timestamps[0]) / self.speed
+            now = time.monotonic()
+            if self._start is None:
+                self._start = now - offset
+            delay = self._start + offset - now
+            if delay > 0:
+                time.sleep(delay)
+        frame = self.log.frames[self._index]
+        self._index += 1
+        return frame
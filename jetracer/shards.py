@@ -0,0 +1,122 @@
+import json
+import os
+
+import cv2
+import numpy as np
+import torch
+import torch.utils.data
+
+from .preprocess import Preprocessor
+
+
+MANIFEST_FILE = 'manifest.json'
+LABELS_FILE = 'labels.npy'
+LABEL_DTYPE = np.dtype([('category_index', '<i2'), ('x', '<f4'), ('y', '<f4')])
+
+
+def export_shards(dataset, directory, size=(224, 224), shard_size=4096, interpolation=cv2.INTER_AREA):
+    """Decode, resize and pack an ``XYDataset`` into uint8 shards for ``ShardDataset``.
+
+    Each ``shard_NNNNN.bin`` holds up to ``shard_size`` BGR frames of
+    ``size`` back to back.  ``labels.npy`` stores the category index and the
+    x/y label normalized to [-1, 1] exactly as ``XYDataset`` returns it.
+    A dataset loaded with a dedup manifest exports only the images it keeps.
+    """
+    width, height = size
+    os.makedirs(directory, exist_ok=True)
+    rows = np.arange(len(dataset.index)) if getattr(dataset, 'rows', None) is None else dataset.rows
+    count = len(rows)
+    labels = np.zeros(count, dtype=LABEL_DTYPE)
+    category_index, xs, ys = dataset.index.labels()
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    shards = []
+    out = None
+    for i, row in enumerate(rows):
+        if i % shard_size == 0:
+            if out is not None:
+                out.close()
+            name = 'shard_%05d.bin' % len(shards)
+            shards.append({'file': name, 'count': min(shard_size, count - i)})
+            out = open(os.path.join(directory, name), 'wb')
+        image = cv2.imread(dataset.index.image_path(row), cv2.IMREAD_COLOR)
+        image_height, image_width = image.shape[:2]
+        cv2.resize(image, (width, height), dst=frame, interpolation=interpolation)
+        out.write(frame.data)
+        labels[i] = (category_index[row],
+                     2.0 * (xs[row] / image_width - 0.5),
+                     2.0 * (ys[row] / image_height - 0.5))
+    if out is not None:
+        out.close()
+    np.save(os.path.join(directory, LABELS_FILE), labels)
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+        json.dump({'version': 1, 'shape': [height, width, 3], 'categories': list(dataset.categories),
+                   'count': count, 'shards': shards}, f)
+
+
+class ShardDataset(torch.utils.data.Dataset):
+    """Zero-copy reader for shards written by ``export_shards``.
+
+    Items are ``(image, category_index, xy)`` like ``XYDataset``, except that
+    ``image`` is the raw HxWx3 uint8 BGR frame backed by the memory map.
+    Augmentation and normalization are applied to whole batches by
+    ``ShardBatchTransform`` after collation.
+    """
+
+    def __init__(self, directory):
+        super(ShardDataset, self).__init__()
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.shape = tuple(self.manifest['shape'])
+        self.categories = self.manifest['categories']
+        self.labels = np.load(os.path.join(directory, LABELS_FILE))
+        self._xy = torch.from_numpy(np.stack([self.labels['x'], self.labels['y']], axis=1))
+        self._offsets = np.cumsum([0] + [s['count'] for s in self.manifest['shards']])
+        self._maps = None
+
+    def __getstate__(self):
+        # DataLoader workers map the shards themselves instead of pickling them
+        state = self.__dict__.copy()
+        state['_maps'] = None
+        return state
+
+    def _open(self):
+        # copy-on-write so torch gets a writable (but still zero-copy) array
+        self._maps = [np.memmap(os.path.join(self.directory, s['file']), dtype=np.uint8, mode='c',
+                                shape=(s['count'],) + self.shape)
+                      for s in self.manifest['shards']]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        if self._maps is None:
+            self._open()
+        shard = int(np.searchsorted(self._offsets, idx, side='right')) - 1
+        image = torch.from_numpy(self._maps[shard][idx - self._offsets[shard]])
+        return image, int(self.labels['category_index'][idx]), self._xy[idx]
+
+
+class ShardBatchTransform(object):
+    """Random horizontal flip and normalization for a collated ``ShardDataset`` batch.
+
+    Takes the NxHxWx3 uint8 images and Nx2 labels from the ``DataLoader`` and
+    returns normalized Nx3xHxW images (in the output buffers of a
+    ``Preprocessor``) and labels with x negated for the flipped samples.
+    Channels stay in BGR order by default to match ``XYDataset``.
+    """
+
+    def __init__(self, max_batch, size=(224, 224), device='cpu', dtype='fp32', random_hflip=False, swap_rb=False,
+                 num_buffers=2):
+        self.random_hflip = random_hflip
+        self.preprocessor = Preprocessor(size=size, device=device, dtype=dtype, swap_rb=swap_rb,
+                                         max_batch=max_batch, num_buffers=num_buffers)
+
+    def __call__(self, images, xy):
+        if self.random_hflip:
+            flip = torch.rand(images.shape[0]) > 0.5
+            if flip.any():
+                images[flip] = images[flip].flip(2)
+                xy = xy.clone()
+                xy[flip, 0] = -xy[flip, 0]
+        return self.preprocessor.normalize(images), xy
@@ -0,0 +1,43 @@
+import collections
+import threading
+import time
+
+import numpy as np
+import traitlets
+
+from .racecar import Racecar
+
+
+def synthetic_frame(index, width=224, height=224):
+    """Render a BGR test frame with a lane line that sweeps left and right."""
+    center = width * (0.5 + 0.3 * np.sin(index / 30.0))
+    columns = np.arange(width, dtype=np.float32)
+    # lane drifts towards the center as it approaches the horizon
+    rows = np.linspace(1.0, 0.3, height, dtype=np.float32)[:, None]
+    lane = np.abs(columns[None, :] - (width / 2 + (center - width / 2) * rows)) < 6
+    frame = np.full((height, width, 3), 60, dtype=np.uint8)
+    frame[lane] = (255, 255, 255)
+    frame[:, :, 1] = (index * 7) % 256
+    return frame
+
+
+class MockRacecar(Racecar):
+    """Racecar that records commands instead of driving servos.
+
+    ``write_latency`` simulates the time a real actuator write blocks the
+    caller.
+    """
+
+    write_latency = traitlets.Float(default_value=0.0)
+
+    def __init__(self, *args, history=10000, **kwargs):
+        super(MockRacecar, self).__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.commands = collections.deque(maxlen=history)
+
+    @traitlets.observe('steering', 'throttle')
+    def _on_command(self, change):
+        if self.write_latency > 0:
+            time.sleep(self.write_latency)
+        with self._lock:
+            self.commands.append((time.monotonic(), change['name'], change['new']))
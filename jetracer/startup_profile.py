@@ -0,0 +1,136 @@
+"""Break down the time from process start to the first steering command.
+
+    python -m jetracer.startup_profile --model road_following_model.pth --format torchscript
+    python -m jetracer.startup_profile --backend synthetic --car simulated
+
+Each phase (imports, model load, camera first frame, first actuation) is
+timed in order and printed with its cumulative time.  Run it twice to see
+the effect of the artifact cache: the first run converts the checkpoint,
+the second one just loads it.
+"""
+import argparse
+import contextlib
+import os
+import threading
+import time
+
+from .tracing import tracer
+
+
+class StartupProfile(object):
+
+    def __init__(self):
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.phases.append((name, (end - start) / 1e6))
+            tracer.record('startup.' + name, start, end)
+
+    def format(self):
+        lines = ['%-28s %10s %10s' % ('phase', 'ms', 'total ms')]
+        total = 0.0
+        for name, duration in self.phases:
+            total += duration
+            lines.append('%-28s %10.1f %10.1f' % (name, duration, total))
+        return '\n'.join(lines)
+
+
+def process_age():
+    """Seconds since this process was started (None where /proc isn't available)."""
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', help='checkpoint (.pth) to load; random resnet18 weights if omitted')
+    parser.add_argument('--format', default='eager',
+                        choices=('eager', 'torchscript', 'onnx', 'dynamic_int8', 'trt'),
+                        help='engine to run the checkpoint with (converted artifacts are cached)')
+    parser.add_argument('--backend', default='csi', help='camera backend (see jetracer.camera_backends.BACKENDS)')
+    parser.add_argument('--car', default='async', choices=('async', 'servokit', 'simulated'))
+    parser.add_argument('--timeout', type=float, default=30.0, help='give up waiting for the first actuation')
+    parser.add_argument('--trace', help='write a Chrome trace of the startup to this file')
+    args = parser.parse_args()
+    if args.trace:
+        tracer.enable()
+
+    age = process_age()
+    profile = StartupProfile()
+    if age is not None:
+        profile.phases.append(('interpreter + jetracer', age * 1000.0))
+
+    with profile.phase('import numpy, cv2'):
+        import cv2  # noqa: F401
+        import numpy
+    with profile.phase('import torch'):
+        import torch  # noqa: F401
+    with profile.phase('import jetracer modules'):
+        from .camera_utils import JetRacerCamera
+        from .drive_pipeline import DrivePipeline
+        from .inference import EagerEngine, build_model, cached_engine, cached_trt_module, load_engine
+        from .preprocess import Preprocessor
+
+    with profile.phase('model load (%s)' % args.format):
+        if args.model is None:
+            engine = EagerEngine(build_model())
+        elif args.format == 'eager':
+            engine = load_engine(args.model)
+        elif args.format == 'trt':
+            engine = cached_trt_module(args.model)
+        else:
+            engine = cached_engine(args.model, args.format)
+    if args.format == 'trt':
+        preprocess = Preprocessor(device='cuda', dtype='fp16', swap_rb=False)
+    else:
+        preprocess = Preprocessor(swap_rb=False)
+    with profile.phase('first inference'):
+        engine(preprocess(numpy.zeros((224, 224, 3), numpy.uint8)))
+
+    with profile.phase('camera first frame'):
+        camera = JetRacerCamera('inference', backend=args.backend)
+        if not camera.start():
+            raise SystemExit('camera did not start')
+
+    with profile.phase('car init'):
+        if args.car == 'servokit':
+            from .nvidia_racecar import NvidiaRacecar
+            car = NvidiaRacecar()
+        else:
+            from .nvidia_racecar import AsyncNvidiaRacecar
+            from .pca9685 import SimulatedPCA9685Bus
+            car = AsyncNvidiaRacecar(bus=SimulatedPCA9685Bus() if args.car == 'simulated' else None)
+
+    actuated = threading.Event()
+    pipeline = DrivePipeline(camera, preprocess, engine, car)
+    pipeline.observe(lambda packet, steering: actuated.set())
+    try:
+        with profile.phase('first actuation'):
+            pipeline.start()
+            if not actuated.wait(args.timeout):
+                raise SystemExit('no steering command within %gs' % args.timeout)
+    finally:
+        pipeline.stop()
+        if hasattr(car, 'close'):
+            car.close()
+        camera.stop()
+
+    print(profile.format())
+    if args.trace:
+        print('wrote %d trace events to %s' % (tracer.export_chrome_trace(args.trace), args.trace))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Low-overhead span tracing for the drive loop's hot path.
+
+Instrumented code does::
+
+    from jetracer.tracing import tracer
+
+    with tracer.span('camera.grab'):
+        ...
+
+Tracing is off by default and ``span`` then returns a shared no-op context
+manager.  When enabled, spans go into a preallocated ring of records; a slot
+is claimed with ``next()`` on an ``itertools.count``, which is atomic under
+the GIL, so writers never take a lock.  ``export_chrome_trace`` writes the
+ring as Chrome trace JSON (open it in chrome://tracing or ui.perfetto.dev)
+and ``stats``/``format_stats`` give a rolling summary while driving.
+"""
+import collections
+import itertools
+import json
+import threading
+import time
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('_tracer', '_name_id', '_start')
+
+    def __init__(self, tracer, name_id):
+        self._tracer = tracer
+        self._name_id = name_id
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self._tracer._write(self._name_id, self._start, time.perf_counter_ns())
+        return False
+
+
+class Tracer(object):
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.enabled = False
+        self._names = []
+        self._name_ids = {}
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._slots = itertools.count()
+        self._name = [0] * self.capacity
+        self._start = [0] * self.capacity
+        self._duration = [-1] * self.capacity
+        self._thread = [0] * self.capacity
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _name_id(self, name):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            with self._lock:
+                name_id = self._name_ids.setdefault(name, len(self._names))
+                if name_id == len(self._names):
+                    self._names.append(name)
+        return name_id
+
+    def _write(self, name_id, start, end):
+        slot = next(self._slots) % self.capacity
+        thread = threading.get_ident()
+        if thread not in self._thread_names:
+            self._thread_names[thread] = threading.current_thread().name
+        self._duration[slot] = -1
+        self._name[slot] = name_id
+        self._start[slot] = start
+        self._thread[slot] = thread
+        self._duration[slot] = end - start
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, self._name_id(name))
+
+    def record(self, name, start_ns, end_ns=None):
+        """Record a span measured by the caller with ``time.perf_counter_ns()``."""
+        if self.enabled:
+            self._write(self._name_id(name), start_ns, time.perf_counter_ns() if end_ns is None else end_ns)
+
+    def records(self):
+        """Return the completed spans as ``(name, start_ns, duration_ns, thread_id)`` sorted by start."""
+        result = []
+        for slot in range(self.capacity):
+            duration = self._duration[slot]
+            if duration >= 0:
+                result.append((self._names[self._name[slot]], self._start[slot], duration, self._thread[slot]))
+        result.sort(key=lambda r: r[1])
+        return result
+
+    def export_chrome_trace(self, path):
+        """Write the recorded spans as a Chrome trace event file."""
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': thread, 'args': {'name': name}}
+                  for thread, name in list(self._thread_names.items())]
+        for name, start, duration, thread in self.records():
+            events.append({'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': 0, 'tid': thread,
+                           'ts': start / 1000.0, 'dur': duration / 1000.0})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+    def stats(self, window=1.0):
+        """Summarize spans that ended in the last ``window`` seconds, per span name."""
+        cutoff = time.perf_counter_ns() - int(window * 1e9)
+        durations = collections.defaultdict(list)
+        for name, start, duration, _ in self.records():
+            if start + duration >= cutoff:
+                durations[name].append(duration / 1e6)
+        summary = {}
+        for name, values in durations.items():
+            values.sort()
+            summary[name] = {
+                'rate': len(values) / window,
+                'mean_ms': sum(values) / len(values),
+                'p95_ms': values[min(len(values) - 1, int(0.95 * len(values)))],
+                'max_ms': values[-1],
+            }
+        return summary
+
+    def format_stats(self, window=1.0):
+        lines = ['%-20s %8s %9s %9s %9s' % ('span', 'rate/s', 'mean ms', 'p95 ms', 'max ms')]
+        for name, s in sorted(self.stats(window).items()):
+            lines.append('%-20s %8.1f %9.2f %9.2f %9.2f' % (name, s['rate'], s['mean_ms'], s['p95_ms'], s['max_ms']))
+        return '\n'.join(lines)
+
+    def watch(self, interval=1.0, count=None):
+        """Print rolling stats every ``interval`` seconds (``count`` times, or until interrupted)."""
+        try:
+            for _ in itertools.count() if count is None else range(count):
+                time.sleep(interval)
+                print(self.format_stats(interval), flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
+tracer = Tracer()
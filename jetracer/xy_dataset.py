@@ -0,0 +1,165 @@
+import torch
+import collections
+import os
+import uuid
+import PIL.Image
+import torch.utils.data
+import cv2
+import numpy as np
+
+from .annotation_index import AnnotationIndex
+from .dedup import load_manifest
+
+
+class LRUCache(object):
+    """Bounded least-recently-used mapping; a capacity of 0 disables it."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+
+class XYDataset(torch.utils.data.Dataset):
+    """Labelled road images stored as ``<directory>/<category>/<x>_<y>_<uuid>.jpg``.
+
+    ``cache_size`` keeps that many decoded frames in an LRU cache so repeated
+    epochs skip JPEG decoding; each ``DataLoader`` worker has its own cache.
+    For large datasets ``jetracer.shards`` is faster still.  With ``manifest``
+    (written by ``jetracer.dedup``) only the images it keeps are served;
+    ``get_count`` still counts everything saved.
+    """
+
+    def __init__(self, directory, categories, transform=None, random_hflip=False, cache_size=0, manifest=None):
+        super(XYDataset, self).__init__()
+        self.directory = directory
+        self.categories = categories
+        self.transform = transform
+        self.cache = LRUCache(cache_size)
+        self.index = AnnotationIndex(directory, categories)
+        self.manifest = manifest
+        self.rows = None
+        if self.index.created:
+            self.refresh()
+        else:
+            self._select_rows()
+        self.random_hflip = random_hflip
+        
+    def _select_rows(self):
+        # index rows of the images kept by the manifest (None: all rows)
+        if self.manifest is None:
+            self.rows = None
+            return
+        keep = load_manifest(self.manifest)
+        category_index = self.index.category_index
+        self.rows = np.array([i for i, filename in enumerate(self.index.filenames)
+                              if self.categories[category_index[i]] + '/' + filename in keep], dtype=np.int64)
+        
+    def __len__(self):
+        return len(self.index) if self.rows is None else len(self.rows)
+    
+    def __getitem__(self, idx):
+        if self.rows is not None:
+            idx = int(self.rows[idx])
+        image = self.cache.get(idx)
+        if image is None:
+            image = cv2.imread(self.index.image_path(idx), cv2.IMREAD_COLOR)
+            self.cache.put(idx, image)
+        image = PIL.Image.fromarray(image)
+        width = image.width
+        height = image.height
+        if self.transform is not None:
+            image = self.transform(image)
+        
+        x = 2.0 * (self.index.x[idx] / width - 0.5) # -1 left, +1 right
+        y = 2.0 * (self.index.y[idx] / height - 0.5) # -1 top, +1 bottom
+        
+        if self.random_hflip and np.random.random() > 0.5:
+            image = torch.flip(image, [-1])
+            x = -x
+            
+        return image, int(self.index.category_index[idx]), torch.Tensor([x, y])
+        
+    def refresh(self):
+        """Re-scan the category directories for images added or removed outside ``save_entry``."""
+        result = self.index.reconcile()
+        self._select_rows()
+        # the cache is keyed by row position, which reconcile may have reassigned
+        self.cache.clear()
+        return result
+        
+    def save_entry(self, category, image, x, y, writer=None):
+        """Save a labelled image; with a ``jetracer.image_writer.AsyncImageWriter`` the write happens
+        in the background and the sample is indexed once it is on disk (``writer.flush()`` to wait).
+        """
+        category_dir = os.path.join(self.directory, category)
+        filename = '%d_%d_%s.jpg' % (x, y, str(uuid.uuid1()))
+        image_path = os.path.join(category_dir, filename)
+        if writer is not None:
+            return writer.submit(image_path, image, lambda path: self.index.add(category, filename, x, y))
+        os.makedirs(category_dir, exist_ok=True)
+        cv2.imwrite(image_path, image)
+        self.index.add(category, filename, x, y)
+        return True
+        
+    def get_count(self, category):
+        return self.index.count(category)
+
+
+class HeatmapGenerator():
+    """Gaussian heatmaps over a [-1, 1] x [-1, 1] grid of ``shape`` (rows, cols)."""
+
+    def __init__(self, shape, std):
+        self.shape = shape
+        self.std = std
+        self.idx0 = torch.linspace(-1.0, 1.0, self.shape[0]).reshape(self.shape[0], 1)
+        self.idx1 = torch.linspace(-1.0, 1.0, self.shape[1]).reshape(1, self.shape[1])
+        self._grids = {}
+        
+    def _scaled_grids(self, std, device):
+        # the 1-D row/column coordinates divided by std, cached per (std, device)
+        key = (float(std), str(device))
+        grids = self._grids.get(key)
+        if grids is None:
+            grids = (self.idx0.reshape(-1).to(device) / std, self.idx1.reshape(-1).to(device) / std)
+            self._grids[key] = grids
+        return grids
+        
+    def generate_heatmaps(self, xy, std=None, out=None):
+        """Generate heatmaps for an N x K x 2 tensor of (x, y) keypoints in one call.
+
+        Returns an N x K x H x W tensor (written into ``out`` if given).  The
+        2-D Gaussian is separable, so each heatmap is computed as the outer
+        product of a row and a column profile instead of an ``exp`` over the
+        full grid.
+        """
+        std = self.std if std is None else std
+        xy = torch.as_tensor(xy, dtype=torch.float32)
+        rows, cols = self._scaled_grids(std, xy.device)
+        row_profile = (rows - xy[..., 1:2] / std).square_().neg_().exp_()
+        col_profile = (cols - xy[..., 0:1] / std).square_().neg_().exp_()
+        return torch.mul(row_profile.unsqueeze(-1), col_profile.unsqueeze(-2), out=out)
+        
+    def generate_heatmap(self, xy):
+        return self.generate_heatmaps(torch.as_tensor(xy, dtype=torch.float32).reshape(1, 1, 2))[0, 0]
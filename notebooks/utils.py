@@ -1,16 +1,12 @@
 import torch
-import torchvision.transforms as transforms
-import torch.nn.functional as F
-import cv2
-import PIL.Image
-import numpy as np
+from jetracer.preprocess import Preprocessor
+
+device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+# BGR channel order to match how XYDataset fed the models during training.
+# DrivePipeline copies the result before inference, so one buffer is enough.
+_preprocessor = Preprocessor(device=device, swap_rb=False)
 
-mean = torch.Tensor([0.485, 0.456, 0.406]).cuda()
-std = torch.Tensor([0.229, 0.224, 0.225]).cuda()
 
 def preprocess(image):
-    device = torch.device('cuda')
-    image = PIL.Image.fromarray(image)
-    image = transforms.functional.to_tensor(image).to(device)
-    image.sub_(mean[:, None, None]).div_(std[:, None, None])
-    return image[None, ...]
\ No newline at end of file
+    return _preprocessor(image)
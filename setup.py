@@ -8,4 +8,9 @@ setup(
     install_requires=[
         'adafruit-circuitpython-servokit'
     ],
+    entry_points={
+        'console_scripts': [
+            'jetracer-startup-profile=jetracer.startup_profile:main',
+        ],
+    },
 )
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from jetracer.actuator import ActuatorWriter
+from jetracer.nvidia_racecar import AsyncNvidiaRacecar
+from jetracer.pca9685 import LED0_ON_L, SimulatedPCA9685Bus
+
+
+# one PCA9685 tick at 50 Hz, the resolution pulse widths read back at
+TICK_US = 1e6 / (4096 * 50)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def make_racecar(byte_time=0.0, **kwargs):
+    bus = SimulatedPCA9685Bus(byte_time=byte_time)
+    car = AsyncNvidiaRacecar(bus=bus, **kwargs)
+    return car, bus
+
+
+def test_set_is_coalesced_to_max_rate():
+    flushes = []
+    writer = ActuatorWriter(flushes.append, max_rate=50.0)
+    start = time.monotonic()
+    for i in range(2000):
+        writer.set(i % 2, float(i))
+        time.sleep(0.0001)
+    writer.close()
+    elapsed = time.monotonic() - start
+    # one flush per period, plus the one close() makes for the last values
+    assert len(flushes) <= 50.0 * elapsed + 2
+    assert writer.command_count == 2000
+    latest = {}
+    for pulses in flushes:
+        latest.update(pulses)
+    assert latest == {0: 1998.0, 1: 1999.0}
+
+
+def test_both_channels_in_one_block_write():
+    car, bus = make_racecar(max_update_rate=5.0)
+    car.steering = 0.2
+    # the writer now sleeps a full period, so the next two commands are flushed together
+    wait_for(lambda: car.writer.flush_count == 1)
+    before = len(bus.transactions)
+    car.steering = -0.4
+    car.throttle = 0.3
+    car.close()
+    writes = [(register, n) for _, _, register, n in list(bus.transactions)[before:]]
+    assert writes
+    assert all(write == (LED0_ON_L, 8) for write in writes)
+
+
+@pytest.mark.parametrize('settings, steering, throttle', [
+    # ServoKit continuous servo mapping: 1500 +- 750 us
+    ({}, 1500 - 0.325 * 750, 1500 + 0.2 * 750),
+    # the smbus racecar in notebooks/tests.ipynb: forward throttle shortens the pulse
+    (dict(steering_offset=0.17, steering_range=500, throttle_range=-200, min_pulse=1000, max_pulse=2000),
+     1500 - 0.155 * 500, 1500 - 0.2 * 200),
+])
+def test_pulse_widths_reach_the_bus(settings, steering, throttle):
+    car, bus = make_racecar(**settings)
+    car.steering = 0.5
+    car.throttle = 0.25
+    wait_for(lambda: abs(bus.channel_pulse(car.i2c_address, car.throttle_channel) - throttle) <= TICK_US
+             and abs(bus.channel_pulse(car.i2c_address, car.steering_channel) - steering) <= TICK_US)
+    car.writer.close()
+
+
+def test_pulses_are_clamped():
+    car, bus = make_racecar(steering_range=500, min_pulse=1000, max_pulse=2000)
+    assert car._pulse(1.5, car.steering_range) == 2000
+    assert car._pulse(-1.5, car.steering_range) == 1000
+    car.writer.close()
+
+
+def test_command_to_bus_latency():
+    rate = 100.0
+    # about 22 us per byte, a 400 kHz bus
+    car, bus = make_racecar(byte_time=22e-6, max_update_rate=rate)
+    latencies = []
+    for i in range(50):
+        commanded = time.monotonic()
+        car.steering = 0.5 if i % 2 else -0.5
+        wait_for(lambda: bus.transactions[-1][0] >= commanded)
+        latencies.append(bus.transactions[-1][0] - commanded)
+    car.writer.close()
+    latencies.sort()
+    # a command waits at most one writer period plus the transfer itself
+    assert latencies[len(latencies) // 2] <= 1.0 / rate + 0.005
+    assert car.writer.stats()['latency_p50'] <= 1.0 / rate + 0.005
+
+
+def test_close_centers_both_channels():
+    car, bus = make_racecar()
+    car.steering = 1.0
+    car.throttle = 1.0
+    car.close()
+    assert abs(bus.channel_pulse(car.i2c_address, car.steering_channel) - car.center_pulse) <= TICK_US
+    assert abs(bus.channel_pulse(car.i2c_address, car.throttle_channel) - car.center_pulse) <= TICK_US
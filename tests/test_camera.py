@@ -0,0 +1,37 @@
+import time
+
+from jetracer.camera_backends import SyntheticBackend
+from jetracer.camera_utils import JetRacerCamera
+
+
+class BusyBackend(SyntheticBackend):
+    """Fails to open until ``busy_for`` seconds after it was created, like a camera still being released."""
+
+    def __init__(self, busy_for):
+        super(BusyBackend, self).__init__(width=64, height=48, fps=100)
+        self.ready_at = time.monotonic() + busy_for
+        self.attempts = 0
+
+    def open(self):
+        self.attempts += 1
+        if time.monotonic() < self.ready_at:
+            raise RuntimeError('device busy')
+        super(BusyBackend, self).open()
+
+
+def test_start_retries_open_until_the_device_is_free():
+    backend = BusyBackend(0.3)
+    camera = JetRacerCamera('safe', backend=backend)
+    assert camera.start(timeout=5.0)
+    assert backend.attempts > 1
+    assert camera.read().shape == (48, 64, 3)
+    camera.stop()
+
+
+def test_start_gives_up_after_timeout():
+    backend = BusyBackend(60.0)
+    camera = JetRacerCamera('safe', backend=backend)
+    started = time.monotonic()
+    assert not camera.start(timeout=0.3)
+    assert time.monotonic() - started < 1.0
+    assert not camera.running
@@ -0,0 +1,64 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from jetracer.camera_backends import CameraBackend, Pacer
+from jetracer.camera_broker import BrokerBackend, CameraBroker
+from jetracer.camera_utils import JetRacerCamera
+
+
+class UniformBackend(CameraBackend):
+    """Every frame is a single value, so a frame mixing two of them was torn."""
+
+    def __init__(self, width=320, height=240, fps=500):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self._pacer = Pacer(fps)
+        self._index = 0
+
+    def grab(self):
+        self._pacer.wait()
+        self._index += 1
+        return np.full((self.height, self.width, 3), self._index % 256, np.uint8)
+
+
+@pytest.fixture
+def broker():
+    name = 'jetracer-test-%d' % os.getpid()
+    # a small ring written fast, so readers are lapped often
+    broker = CameraBroker(UniformBackend(), name=name, slots=2).start()
+    yield broker
+    broker.stop()
+
+
+@pytest.mark.parametrize('mode', ['safe', 'inference'])
+def test_reader_frames_are_never_torn(broker, mode):
+    torn = []
+    sizes = set()
+
+    def check(change):
+        frame = change['new']
+        sizes.add(frame.shape)
+        if frame.min() != frame.max():
+            torn.append(change['seq'])
+
+    camera = JetRacerCamera(mode, backend=BrokerBackend(broker.name))
+    camera.observe(check)
+    assert camera.start()
+    time.sleep(0.5)
+    camera.stop()
+    assert not torn
+    assert sizes == {(240, 320, 3) if mode == 'safe' else (224, 224, 3)}
+
+
+def test_grab_returns_a_private_copy(broker):
+    backend = BrokerBackend(broker.name, width=160, height=120)
+    backend.open()
+    frame = backend.grab()
+    assert frame.shape == (120, 160, 3)
+    assert frame.base is None
+    assert frame.min() == frame.max()
+    backend.close()
@@ -0,0 +1,19 @@
+import numpy as np
+
+from jetracer.camera_utils import FrameRing
+
+
+def test_slot_being_written_is_not_readable():
+    ring = FrameRing(3, (2, 2, 3))
+    for i in range(3):
+        ring.next_slot()[:] = i
+        ring.publish(float(i))
+    slot = ring.next_slot()
+    # frame 0 lives in the slot handed to the writer
+    assert ring.get(0) is None
+    assert ring.get(1)[0].max() == 1
+    slot[:] = 3
+    ring.publish(3.0)
+    frame, seq, timestamp = ring.get(3)
+    assert seq == 3 and timestamp == 3.0 and np.all(frame == 3)
+    assert ring.latest()[1] == 3
@@ -0,0 +1,48 @@
+import errno
+import os
+
+import numpy as np
+
+from jetracer import image_writer
+from jetracer.image_writer import AsyncImageWriter
+
+
+def frame(value=0):
+    return np.full((48, 64, 3), value, np.uint8)
+
+
+def test_callbacks_run_after_write(tmp_path):
+    saved = []
+    with AsyncImageWriter(workers=2) as writer:
+        for i in range(10):
+            writer.submit(str(tmp_path / 'a' / ('%d.jpg' % i)), frame(i), saved.append)
+    assert sorted(saved) == sorted(str(tmp_path / 'a' / ('%d.jpg' % i)) for i in range(10))
+    assert all(os.path.getsize(path) > 0 for path in saved)
+    assert writer.stats()['written'] == 10
+
+
+def test_fsync_error_is_counted_and_worker_survives(tmp_path, monkeypatch):
+    real_fsync = os.fsync
+    failures = [1]
+
+    def flaky_fsync(fd):
+        if failures:
+            failures.pop()
+            raise OSError(errno.EIO, 'injected')
+        real_fsync(fd)
+
+    monkeypatch.setattr(image_writer.os, 'fsync', flaky_fsync)
+    saved = []
+    writer = AsyncImageWriter(workers=1, batch_size=4)
+    for i in range(3):
+        writer.submit(str(tmp_path / ('%d.jpg' % i)), frame(i), saved.append)
+    assert writer.flush(timeout=5)
+    # the worker is still alive and keeps writing
+    writer.submit(str(tmp_path / '3.jpg'), frame(3), saved.append)
+    assert writer.flush(timeout=5)
+    writer.close()
+    stats = writer.stats()
+    assert stats['errors'] == 1
+    assert stats['written'] == 3
+    assert stats['queue_depth'] == 0
+    assert len(saved) == 3
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from jetracer import preview as preview_module
+from jetracer.drive_pipeline import Packet
+from jetracer.preview import PreviewEncoder
+
+PERIOD = 1 / 30.0
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(preview_module, 'time', clock)
+    return clock
+
+
+def drive(preview, clock, ages, first_seq=0):
+    """Issue one command per camera frame, each ``age`` seconds after the frame was captured."""
+    for i, age in enumerate(ages):
+        seq = first_seq + i
+        captured = seq * PERIOD
+        clock.now = captured + age
+        # the preview thread refreshes the deadline between encodes
+        preview._update_deadline()
+        preview(Packet(seq, captured, np.zeros(2)), 0.0)
+
+
+def test_slow_model_is_not_a_miss(clock):
+    preview = PreviewEncoder(None)
+    # a 150 ms model whose frames also wait up to a camera period for it
+    drive(preview, clock, [0.15 + PERIOD * (i % 3) / 3 for i in range(100)])
+    assert preview.deadline_misses == 0
+    assert preview.camera_period == pytest.approx(PERIOD)
+    assert 0.15 < preview.deadline < 0.25
+
+
+def test_late_commands_back_off(clock):
+    preview = PreviewEncoder(None)
+    drive(preview, clock, [0.05] * 50)
+    assert preview.deadline_misses == 0
+    drive(preview, clock, [0.2] * 3, first_seq=50)
+    assert preview.deadline_misses == 3
+    preview._adapt(clock.now)
+    assert preview.fps == preview.max_fps / 2
+    assert preview.quality == preview.max_quality - 10